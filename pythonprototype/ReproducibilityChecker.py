@@ -1,144 +1,39 @@
 import os
+import queue
 import tkinter
-import threading
-from google import genai
-from google.genai import types
 import json
-from pypdf import PdfReader
-import re
 from tkinter import ttk
 from tkinter import filedialog,messagebox, simpledialog
-import json5
-
-def extract_sections_using_bookmarks(reader: PdfReader):
-    """Splits the PDF into sections using its bookmarks."""
-    sections = {}
-    bookmarks = []
-
-    # get and save bookmarks
-    for item in reader.outline:
-        if "/Title" in item:
-            title = item["/Title"]
-            bookmarks.append(title)
-
-    #if pdf has no bookmarks just use full text
-    if not bookmarks:
-        return {"Full Text": "\n".join(page.extract_text() for page in reader.pages if page.extract_text())}
-
-    all_text = ""
-    for page in reader.pages:
-        all_text += page.extract_text() + "\n"
-
-    # remove all double new lines from text so that headlines will be found and not broken up
-    all_text = re.sub(r'(?<!\n)\n(?!\n)', ' ', all_text)
-    # Extract text for each section
-    for i in range(len(bookmarks)):
-        # get current and next bookmark
-        title = bookmarks[i]
-        next_title = bookmarks[i + 1] if i + 1 < len(bookmarks) else None
-
-        # look for current title in text
-        match = re.search(re.escape(title), all_text, re.IGNORECASE)
-        if not match:
-            print("title not found")
-        section_start = all_text[match.end():]
-
-        # look for next title in text and cut off
-        if next_title:
-            next_match = re.search(re.escape(next_title), section_start, re.IGNORECASE)
-            if next_match:
-                section_text = section_start[:next_match.start()]
-            else:
-                section_text = section_start
-        else:
-            section_text = section_start
-
-        # saves each section
-        sections[title] = section_text.strip()
-
-    return sections
-
-
-def extract_json_from_response(text):
-    """parse LLM output to JSON, output start and ends with ```  """
-    lines = text.strip().splitlines()
-
-    if lines and lines[0].startswith("```"):
-        lines = lines[1:]
-
-    if lines and lines[-1].strip() =="```":
-        lines = lines[:-1]
-
-    json_content = "\n".join(lines)
-    return json_content
-
+from responsecache import ResponseCache
+from llmbackends import GeminiBackend, build_prompt
+from sectioncache import load_sections
+from pdfextraction import extract_all_sections
+from responseparser import IncrementalJSONParser, parse_evaluation
+from scheduler import EvaluationScheduler
+from batchchecker import select_sections
+from telemetry import get_telemetry
 
-def generate(pdf_text, checklist, api_key):
-    client = genai.Client(
-        api_key=api_key,
-    )
+# papers evaluated at the same time, the others wait in the queue
+MAX_CONCURRENT_EVALUATIONS = 2
 
-    model = "gemma-3-27b-it"
+# how often the Tk thread applies the UI updates of the workers
+UI_POLL_MS = 50
 
-    prompt = f"""
-            Evaluate the following document with respect to the checklist criteria below:
 
-            Document:
-            \"\"\"{pdf_text}\"\"\"
+def generate(pdf_text, checklist, api_key, cache=None, count_tokens=False):
+    """make the LLM request through the Gemini backend, with a ResponseCache the cached response is returned
+    if the same request was made before. count_tokens=True additionally asks the API for the exact prompt token count"""
+    backend = GeminiBackend(api_key)
+    if count_tokens:
+        print(f"total tokens: {backend.count_tokens(build_prompt(pdf_text, checklist))}")
+    return backend.generate(pdf_text, checklist, cache)
 
 
-            Checklist:
-            {checklist}
+def generate_stream(pdf_text, checklist, api_key, cache=None, validate=None):
+    """like generate() but yields the response in chunks as they arrive, a cached response is yielded at once"""
+    return GeminiBackend(api_key).generate_stream(pdf_text, checklist, cache, validate)
 
 
-            For each checklist item, provide:
-            - `criterion`: the name of the checklist item
-            - `status`: one of "Met", "Not Met"
-            - `justification`: a short explanation of where or why the criterion is (not) met (e.g., section title, paragraph context, or quote)
-
-
-            Output format:
-            Return only valid JSON, structured like this:
-            [
-                {{
-                  "category": "Open Methodology & Documentation",
-                  "results": [
-                    {{
-                      "criterion": "...",
-                      "status": "Met" | "Not Met",
-                      "justification": "..."
-                    }}
-                  ]
-                }},
-                ...
-            ]
-            Do not include any explanation or commentary outside the JSON.
-        """
-
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=prompt),
-            ],
-        ),
-    ]
-    generate_content_config = types.GenerateContentConfig(
-        temperature=0,
-        response_mime_type="text/plain",
-    )
-    total_tokens = client.models.count_tokens(
-        model=model,contents=prompt
-    )
-
-    response = client.models.generate_content(
-        model=model,
-        contents=contents,
-        config=generate_content_config
-    )
-
-    return response.text
-
 class ReproducibilityChecker:
     def __init__(self, root):
         """Initiate GUI root and variables"""
@@ -150,10 +45,21 @@ class ReproducibilityChecker:
         self.file_label = None
         self.sections = {}
         self.check_vars = {}
+        self.checklist = None
 
         self.api_key = os.environ.get("GEMINI_API_KEY")
+        self.cache = ResponseCache()
+
+        # queued papers by their row in the queue view
+        self.jobs = {}
+        self.scheduler = EvaluationScheduler(MAX_CONCURRENT_EVALUATIONS)
+        # UI updates of the workers, only the Tk thread takes them out and touches the widgets
+        self.ui_updates = queue.Queue()
+        self.closing = False
 
         self.build_gui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self._poll_ui()
 
     def build_gui(self):
         """ Build Frames, Buttons, Lables"""
@@ -193,19 +99,33 @@ class ReproducibilityChecker:
         self.scrollbar.pack(side=tkinter.RIGHT, fill=tkinter.Y)
         self.checklist_view.config(yscrollcommand=self.scrollbar.set)
 
-        self.eval_button = ttk.Button(frame, text="Run Evaluation", command=self.run_evaluation_thread, state="disabled")
+        self.eval_button = ttk.Button(frame, text="Queue Evaluation", command=self.queue_evaluation, state="disabled")
         self.eval_button.grid(row=3, column=0, pady=5, sticky="ew")
 
         self.key_button = ttk.Button(frame, text="Change API Key", command=self.prompt_api_key, state="normal")
         self.key_button.grid(row=3, column=1, pady=5, sticky="ew")
 
+        self.queue_button = ttk.Button(frame, text="Queue PDF Files", command=self.queue_pdfs, state="disabled")
+        self.queue_button.grid(row=4, column=1, pady=5, sticky="ew")
+
         self.status_label = ttk.Label(frame, text="",foreground="blue")
         self.status_label.grid(row=4, column=0, pady=5, sticky="ew")
 
-        self.progressbar = ttk.Progressbar(frame, mode="indeterminate")
-        self.progressbar.grid(row=5, column=0, pady=5, sticky="ew")
+        self.progressbar = ttk.Progressbar(frame, mode="determinate")
+        self.progressbar.grid(row=5, column=0, columnspan=2, pady=5, sticky="ew")
         self.progressbar.grid_remove()
 
+        self.queue_frame = ttk.LabelFrame(frame, text="Evaluation Queue")
+        self.queue_frame.grid(row=6, column=0, columnspan=2, sticky="nsew", pady=10)
+
+        self.queue_view = ttk.Treeview(self.queue_frame, columns=("status", "progress"), height=5)
+        self.queue_view.heading("#0", text="Paper")
+        self.queue_view.heading("status", text="Status")
+        self.queue_view.heading("progress", text="Criteria")
+        self.queue_view.column("progress", width=80, anchor="center")
+        self.queue_view.pack(fill=tkinter.BOTH, expand=True)
+        self.queue_view.bind("<<TreeviewSelect>>", self._show_selected_job)
+
     def prompt_api_key(self):
         """Function to enter API Key"""
         api_key = simpledialog.askstring(
@@ -227,8 +147,8 @@ class ReproducibilityChecker:
         self.file_path = file_path
         filename = os.path.basename(self.file_path)
         self.file_label.config(text=f"Selected file: {filename}")
-        reader = PdfReader(file_path)
-        self.sections = extract_sections_using_bookmarks(reader)
+        # all sections including the references, the user picks the ones to evaluate
+        self.sections = load_sections(file_path, extract_all_sections)
 
         for widget in self.sections_frame.winfo_children():
             widget.destroy()
@@ -258,80 +178,204 @@ class ReproducibilityChecker:
             self.checklist_view.config(state=tkinter.DISABLED)
 
             self.eval_button.config(state="normal")
+            self.queue_button.config(state="normal")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load checklist:\n{str(e)}")
             self.checklist = None
             self.checklist_view.insert(tkinter.END, "File not found.")
             self.checklist_view.config(state=tkinter.DISABLED)
             self.eval_button.config(state="disabled")
+            self.queue_button.config(state="disabled")
 
-    def run_evaluation(self):
-        """Function to run evaluation, input selcted sections and checklist into generate response, show and save JSON if successfully parsed"""
+    def queue_evaluation(self):
+        """Queue the selected sections of the loaded PDF, the GUI stays usable while it is evaluated"""
         selected = [title for title, var in self.check_vars.items() if var.get()]
         if not selected:
             messagebox.showwarning("No Selection", "Please select sections.")
             return
-        combined_text = "\n\n".join(self.sections[title] for title in selected)
-        file_id = os.path.splitext(os.path.basename(self.file_path))[0]
-
         if not self.checklist:
             messagebox.showwarning("Checklist Missing", "Please load a checklist")
             return
-        checklist = self.checklist
-        try:
-            response=generate(combined_text, checklist, self.api_key)
-            responsejson = extract_json_from_response(response)
-            parsed = json5.loads(responsejson)
-            wrapped_data = {
-                "id": file_id,
-                "evaluation": parsed
-            }
-
-            output_dir = "generatedjson"
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, f"{file_id}_evaluation_test.json")
-            with open(output_path, "w") as f:
-                json.dump(wrapped_data, f, indent=2)
-
-            messagebox.showinfo("Success", f"Saved JSON to {output_path}")
-
-            self.checklist_view.config(state=tkinter.NORMAL)
-            self.checklist_view.delete("1.0", tkinter.END)
-            formatted_result = json.dumps(wrapped_data, indent=4)
-            self.checklist_view.insert(tkinter.END, formatted_result)
-            self.checklist_view.config(state=tkinter.DISABLED)
-
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-
-    def run_evaluation_thread(self):
-        """run as thread so program is not frozen during generating and disable buttons while genereating"""
-        self.file_button.config(state="disabled")
-        self.eval_button.config(state="disabled")
-        self.checklist_button.config(state="disabled")
-        self.status_label.config(text="Generating response...")
+        combined_text = "\n\n".join(self.sections[title] for title in selected)
+        self._queue_job(self.file_path, combined_text)
+
+    def queue_pdfs(self):
+        """Queue several PDFs at once, their sections are selected like in batchchecker (references etc. left out)"""
+        file_paths = filedialog.askopenfilenames(filetypes=[("PDF files", "*.pdf")])
+        for file_path in file_paths:
+            self._queue_job(file_path, None)
+
+    def _queue_job(self, file_path, text):
+        file_id = os.path.splitext(os.path.basename(file_path))[0]
+        item = self.queue_view.insert("", tkinter.END, text=file_id, values=("queued", ""))
+        job = {"file_id": file_id, "status": "queued", "result": None, "partial": [], "error": None}
+        self.jobs[item] = job
+        # the job gets the checklist and key of the moment it was queued
+        job["future"] = self.scheduler.submit(self._evaluate_job, item, file_path, text, self.checklist, self.api_key)
+        self._update_progress()
+
+    def _evaluate_job(self, item, file_path, text, checklist, api_key):
+        """Runs in the executor: extract (if needed), generate and parse one paper.
+        The worker never touches a widget, every UI update is queued for the Tk thread."""
+        file_id = self.jobs[item]["file_id"]
+        with get_telemetry().paper(file_id):
+            try:
+                if text is None:
+                    self._ui(self._set_job_status, item, "extracting")
+                    sections = load_sections(file_path)
+                    text = "\n\n".join(sections[title] for title in select_sections(sections))
+                if self.closing:
+                    return
+
+                self._ui(self._set_job_status, item, "generating")
+                total = sum(len(category["criteria"]) for category in checklist)
+                self._ui(self._set_job_progress, item, 0, total)
+
+                # stream the response and show every criterion as soon as it is complete,
+                # the incremental parser is only for the progress, the result is scored from the complete response
+                parser = IncrementalJSONParser()
+                done = 0
+                parsed = []
+                # unparseable output is not cached, so evaluating the paper again makes a new request
+                validate = lambda response: parsed.append(parse_evaluation(response, checklist))
+                stream = generate_stream(text, checklist, api_key, self.cache, validate)
+                try:
+                    for chunk in stream:
+                        # the window was closed: stop the request, the partial response is not cached
+                        if self.closing:
+                            return
+                        for event in parser.feed(chunk):
+                            if event[0] == "criterion":
+                                done += 1
+                                self._ui(self._add_partial_result, item, event[1], event[2])
+                                self._ui(self._set_job_progress, item, done, total)
+                finally:
+                    stream.close()
+
+                wrapped_data = {
+                    "id": file_id,
+                    "evaluation": parsed[-1]
+                }
+
+                output_dir = "generatedjson"
+                os.makedirs(output_dir, exist_ok=True)
+                output_path = os.path.join(output_dir, f"{file_id}_evaluation_test.json")
+                with open(output_path, "w") as f:
+                    json.dump(wrapped_data, f, indent=2)
+
+                self._ui(self._job_finished, item, wrapped_data, output_path)
+            except Exception as e:
+                self._ui(self._job_failed, item, str(e))
+
+    def _ui(self, func, *args):
+        """run func on the Tk thread, dropped once the window is closing"""
+        if not self.closing:
+            self.ui_updates.put((func, args))
+
+    def _poll_ui(self):
+        """Tk thread: apply the queued UI updates of the workers"""
+        while not self.closing:
+            try:
+                func, args = self.ui_updates.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+        if not self.closing:
+            self.root.after(UI_POLL_MS, self._poll_ui)
+
+    def _set_job_status(self, item, status, text=None):
+        self.jobs[item]["status"] = status
+        self.queue_view.set(item, "status", text or status)
+        self._update_progress()
+
+    def _set_job_progress(self, item, done, total):
+        self.queue_view.set(item, "progress", f"{done}/{total}")
+
+    def _add_partial_result(self, item, category, result):
+        self.jobs[item]["partial"].append((category, result))
+        if self._selected_job() == item:
+            self._show_partial_result(category, result)
+
+    def _job_finished(self, item, wrapped_data, output_path):
+        self.jobs[item]["result"] = wrapped_data
+        self._set_job_status(item, "done", f"saved to {output_path}")
+        if self._selected_job() == item:
+            self._show_result(wrapped_data)
+
+    def _job_failed(self, item, error):
+        self.jobs[item]["error"] = error
+        self._set_job_status(item, "failed", f"failed: {error}")
+        if self._selected_job() == item:
+            self._show_error(error)
+
+    def _update_progress(self):
+        """overall determinate progress over all queued papers"""
+        total = len(self.jobs)
+        finished = sum(job["status"] in ("done", "failed") for job in self.jobs.values())
+        running = sum(job["status"] in ("extracting", "generating") for job in self.jobs.values())
         self.progressbar.grid()
-        self.progressbar.start(10)
+        self.progressbar.config(maximum=total, value=finished)
+        self.status_label.config(text=f"{finished}/{total} papers evaluated, {running} running")
 
-        thread = threading.Thread(target=self._threaded_evaluation)
-        thread.start()
+    def _selected_job(self):
+        selection = self.queue_view.selection()
+        return selection[0] if selection else None
+
+    def _show_selected_job(self, event=None):
+        """show the result, the streamed criteria so far or the error of the selected paper"""
+        item = self._selected_job()
+        if item is None:
+            return
+        job = self.jobs[item]
+        if job["result"] is not None:
+            self._show_result(job["result"])
+        elif job["error"] is not None:
+            self._show_error(job["error"])
+        else:
+            self._clear_preview()
+            for category, result in job["partial"]:
+                self._show_partial_result(category, result)
+
+    def _clear_preview(self):
+        self.checklist_view.config(state=tkinter.NORMAL)
+        self.checklist_view.delete("1.0", tkinter.END)
+        self.checklist_view.config(state=tkinter.DISABLED)
+
+    def _show_result(self, wrapped_data):
+        self.checklist_view.config(state=tkinter.NORMAL)
+        self.checklist_view.delete("1.0", tkinter.END)
+        formatted_result = json.dumps(wrapped_data, indent=4)
+        self.checklist_view.insert(tkinter.END, formatted_result)
+        self.checklist_view.config(state=tkinter.DISABLED)
+
+    def _show_error(self, error):
+        self.checklist_view.config(state=tkinter.NORMAL)
+        self.checklist_view.delete("1.0", tkinter.END)
+        self.checklist_view.insert(tkinter.END, f"Evaluation failed:\n{error}")
+        self.checklist_view.config(state=tkinter.DISABLED)
+
+    def _show_partial_result(self, category, result):
+        """append one streamed criterion to the preview"""
+        self.checklist_view.config(state=tkinter.NORMAL)
+        self.checklist_view.insert(tkinter.END, f"{category} - {result.get('criterion')}: {result.get('status')}\n")
+        self.checklist_view.see(tkinter.END)
+        self.checklist_view.config(state=tkinter.DISABLED)
+
+    def on_close(self):
+        """Cancel the queued papers and close the window, the running ones stop at their next response chunk
+        and their UI updates are dropped."""
+        self.closing = True
+        self.scheduler.shutdown(wait=False, cancel_pending=True)
+        self.root.destroy()
+
+    def shutdown(self):
+        """wait for the running papers to stop after the window is closed, the executor threads keep the process alive"""
+        self.closing = True
+        self.scheduler.shutdown(wait=True, cancel_pending=True)
 
-    def _threaded_evaluation(self):
-        try:
-            self.run_evaluation()
-        finally:
-            self.root.after(0, self._reset_ui)
-
-    def _reset_ui(self):
-        """after eval reset ui components to normal state"""
-        self.file_button.config(state="normal")
-        self.eval_button.config(state="normal")
-        self.checklist_button.config(state="normal")
-        self.status_label.config(text="")
-        self.progressbar.stop()
-        self.progressbar.grid_remove()
 
 if __name__ == "__main__":
     root = tkinter.Tk()
     app = ReproducibilityChecker(root)
     root.mainloop()
+    app.shutdown()
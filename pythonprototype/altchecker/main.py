@@ -1,9 +1,13 @@
 import os
+import sys
 from google import genai
 from google.genai import types
 import json
 from pypdf import PdfReader
-import re
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sectioncache import load_sections
+from responseparser import parse_evaluation
 
 def extract_sections_using_bookmarks(reader: PdfReader):
     """Splits the PDF into sections using bookmark page ranges."""
@@ -43,17 +47,6 @@ def extract_sections_using_bookmarks(reader: PdfReader):
 
     return sections
 
-def extract_json_from_response(text):
-    # Regex to match ```json ... ``` or ``` ... ```
-    pattern = r"```(?:json)?\s*(\[\s*[\s\S]*?\s*\])\s*```"
-
-    match = re.search(pattern, text, re.IGNORECASE)
-    if not match:
-        raise ValueError("No JSON block found inside triple backticks.")
-
-    json_str = match.group(1)
-    return json_str
-
 def generate(pdf_text, checklist):
     client = genai.Client(
         api_key=os.environ.get("GEMINI_API_KEY"),
@@ -125,12 +118,11 @@ def generate(pdf_text, checklist):
 if __name__ == "__main__":
     file_name = "BachelorThesisDK.pdf"
     file_id = os.path.splitext(os.path.basename(file_name))[0]
-    reader = PdfReader(file_name)
 
     with open("checklist.json", "r") as file:
         reproducibility_checklist = json.load(file)
 
-    sections = extract_sections_using_bookmarks(reader)
+    sections = load_sections(file_name, extract_sections_using_bookmarks)
     section_names = list(sections.keys())
 
     print("Available sections:")
@@ -155,22 +147,18 @@ if __name__ == "__main__":
     response = generate(combined_text, reproducibility_checklist)
     print(response)
 
-    responsejson = extract_json_from_response(response)
-    if responsejson:
-        try:
-            parsed = json.loads(responsejson)
-            wrapped_data = {
-                "id": file_id,
-                "evaluation": parsed
-            }
-
-            output_path = f"generatedjson/{file_id}_evaluation.json"
-            with open(output_path, "w") as f:
-                json.dump(wrapped_data, f, indent=2)
-
-            print(f"saved JSON to {output_path}")
-        except json.JSONDecodeError:
-            print("failed to parse JSON string")
-    else:
-        print("Failed to generate a valid JSON response.")
-        print(f"Raw Response: {response}")
\ No newline at end of file
+    try:
+        parsed = parse_evaluation(response, reproducibility_checklist)
+        wrapped_data = {
+            "id": file_id,
+            "evaluation": parsed
+        }
+
+        output_path = f"generatedjson/{file_id}_evaluation.json"
+        with open(output_path, "w") as f:
+            json.dump(wrapped_data, f, indent=2)
+
+        print(f"saved JSON to {output_path}")
+    except ValueError as e:
+        print(f"failed to parse JSON string: {e}")
+        print(f"Raw Response: {response}")
@@ -0,0 +1,358 @@
+import os
+import json
+import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llmbackends import build_prompt, create_backend, BACKENDS
+from responseparser import parse_evaluation
+from pdfextraction import extract_sections_using_bookmarks, extract_all_sections
+from sectioncache import load_sections, get_default_cache
+from sectionplanner import estimate_tokens, plan_sections, plan_category_sections, chunk_text, merge_evaluations, \
+    DEFAULT_TOKEN_BUDGET
+from passageindex import PassageIndex, retrieve_passages, DEFAULT_TOP_K
+from prescreen import prescreen, merge_prescreen
+from scheduler import EvaluationScheduler
+from jobjournal import JobJournal
+from jsonscorer import evaluate_json
+from responsecache import ResponseCache, DEFAULT_CACHE_DIR
+from telemetry import Telemetry, get_telemetry, set_telemetry
+
+# sections whose title contains one of these are skipped by the "exclude" policy
+DEFAULT_EXCLUDED_SECTIONS = ["references", "bibliography", "acknowledg"]
+
+SELECTION_POLICIES = ["all", "exclude", "include", "auto", "retrieve"]
+
+
+def select_sections(sections, policy="exclude", keywords=None):
+    """Select section titles without user interaction.
+
+    all:     every section
+    exclude: every section except titles containing one of the keywords
+    include: only titles containing one of the keywords, all sections if none matches
+    (the "auto" policy is handled by sectionplanner.plan_sections, "retrieve" by passageindex)
+    """
+    titles = list(sections)
+    if policy == "all":
+        return titles
+
+    if policy == "exclude":
+        keywords = [k.lower() for k in (keywords or DEFAULT_EXCLUDED_SECTIONS)]
+        return [title for title in titles if not any(k in title.lower() for k in keywords)]
+
+    if policy == "include":
+        keywords = [k.lower() for k in (keywords or [])]
+        selected = [title for title in titles if any(k in title.lower() for k in keywords)]
+        return selected or titles
+
+    raise ValueError(f"Unknown section selection policy: {policy}")
+
+
+def excluded_chunk(sections):
+    """the sections of the "exclude" policy as one chunk, the fallback when retrieval finds nothing"""
+    return [(title, sections[title]) for title in select_sections(sections, "exclude")]
+
+
+def generate_streamed(backend, pdf_text, checklist, cache=None, validate=None):
+    """stream the response, the complete response is parsed by validate like a non-streamed one"""
+    return "".join(backend.generate_stream(pdf_text, checklist, cache, validate))
+
+
+def document_budget(token_budget, checklist):
+    """the tokens left for the paper in a prompt of at most token_budget tokens for the checklist"""
+    budget = token_budget - estimate_tokens(build_prompt("", checklist))
+    if budget <= 0:
+        raise ValueError(f"token budget {token_budget} leaves no room for the paper, "
+                         f"the prompt alone takes {token_budget - budget} tokens")
+    return budget
+
+
+def request_evaluation(text, checklist, backend, scheduler=None, cache=None, stream=False):
+    """one LLM request for the given text and checklist, returns the parsed evaluation list.
+    The response is parsed before it is cached, so unparseable output is never stored."""
+    parsed = []
+
+    def validate(response):
+        parsed.append(parse_evaluation(response, checklist))
+
+    if stream:
+        args = (generate_streamed, backend, text, checklist, cache, validate)
+    else:
+        args = (backend.generate, text, checklist, cache, validate)
+    if scheduler:
+        tokens = estimate_tokens(build_prompt(text, checklist))
+        scheduler.call(*args, tokens=tokens)
+    else:
+        args[0](*args[1:])
+    return parsed[-1]
+
+
+def evaluate_category(text, category, backend, scheduler=None, cache=None, stream=False, parse_retries=1):
+    """Evaluate a single checklist category. Unparseable output is not cached and retried,
+    so only this category is generated again."""
+    for attempt in range(parse_retries + 1):
+        try:
+            evaluation = request_evaluation(text, [category], backend, scheduler, cache, stream)
+            break
+        except ValueError:
+            if attempt == parse_retries:
+                raise
+    # parse_evaluation rejected a response without the category
+    return next(result for result in evaluation if result["category"] == category["category"])
+
+
+def evaluate_per_category(sections, checklist, backend, scheduler=None, cache=None, stream=False,
+                          token_budget=DEFAULT_TOKEN_BUDGET, top_k=None):
+    """one smaller request per checklist category with only its relevant sections, issued in parallel
+    and merged in checklist order. With top_k a category gets the top_k passages of each of its criteria instead,
+    a category without any matching passage gets the sections of the "exclude" policy."""
+    if top_k is not None:
+        index = PassageIndex(sections)
+        plans = {category["category"]: index.select([category], top_k) or excluded_chunk(sections)
+                 for category in checklist}
+    else:
+        # the same budget for every category, the one left by the longest category prompt
+        budget = min(document_budget(token_budget, [category]) for category in checklist)
+        plans = plan_category_sections(sections, checklist, budget)
+    with ThreadPoolExecutor(max_workers=len(checklist)) as executor:
+        futures = [
+            # copied context, so the events of the category requests are attributed to the paper
+            executor.submit(contextvars.copy_context().run, evaluate_category, chunk_text(plans[category["category"]]),
+                            category, backend, scheduler, cache, stream)
+            for category in checklist
+        ]
+        return [future.result() for future in futures]
+
+
+def evaluate_pdf(pdf_path, checklist, backend, policy="exclude", keywords=None, scheduler=None, cache=None,
+                 stream=False, token_budget=DEFAULT_TOKEN_BUDGET, per_category=False, journal=None,
+                 top_k=DEFAULT_TOP_K, prescreen_criteria=False, include_references=False):
+    """Run extraction, generation and parsing for one paper and return the wrapped evaluation.
+    With the "auto" policy the sections are planned under token_budget, a paper that does not fit
+    is evaluated in several chunks whose results are merged.
+    The "retrieve" policy sends only the top_k passages per criterion from a BM25 index of the paper.
+    per_category=True makes one request per checklist category from the sections left by the policy.
+    prescreen_criteria=True decides the criteria with clear textual signals (see prescreen) without the LLM,
+    only the remaining criteria are sent.
+    The text is extracted up to the references unless include_references is set.
+    Progress is recorded in the JobJournal if one is given, all telemetry events are attributed to the paper."""
+    file_id = os.path.splitext(os.path.basename(pdf_path))[0]
+
+    telemetry = get_telemetry()
+    with telemetry.paper(file_id), telemetry.span("paper"):
+        sections = load_sections(pdf_path, section_extractor(include_references))
+        if journal:
+            journal.record(file_id, "extracted")
+
+        decided = {}
+        remaining = checklist
+        if prescreen_criteria:
+            decided, remaining = prescreen(sections, checklist)
+            telemetry.emit("prescreen", decided=len(decided),
+                           remaining=sum(len(category["criteria"]) for category in remaining))
+
+        if not remaining:
+            evaluation = []
+        elif per_category:
+            if policy not in ("auto", "retrieve"):
+                sections = {title: sections[title] for title in select_sections(sections, policy, keywords)}
+            if journal:
+                journal.record(file_id, "prompted")
+            evaluation = evaluate_per_category(sections, remaining, backend, scheduler, cache, stream, token_budget,
+                                               top_k if policy == "retrieve" else None)
+        else:
+            if policy == "auto":
+                budget = document_budget(token_budget, remaining)
+                texts = [chunk_text(chunk) for chunk in plan_sections(sections, remaining, budget)]
+            elif policy == "retrieve":
+                # no passage matches any criterion: send the sections as the "exclude" policy would
+                texts = [chunk_text(retrieve_passages(sections, remaining, top_k) or excluded_chunk(sections))]
+            else:
+                selected = select_sections(sections, policy, keywords)
+                texts = ["\n\n".join(sections[title] for title in selected)]
+
+            if journal:
+                journal.record(file_id, "prompted")
+            evaluations = [request_evaluation(text, remaining, backend, scheduler, cache, stream) for text in texts]
+            evaluation = evaluations[0] if len(evaluations) == 1 else merge_evaluations(evaluations)
+        if journal:
+            journal.record(file_id, "parsed")
+
+        return {
+            "id": file_id,
+            "evaluation": merge_prescreen(evaluation, decided, checklist) if decided else evaluation
+        }
+
+
+def section_extractor(include_references=False):
+    """the section extractor, both variants are cached separately"""
+    return extract_all_sections if include_references else extract_sections_using_bookmarks
+
+
+def save_evaluation(wrapped_data, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{wrapped_data['id']}_evaluation.json")
+    with open(output_path, "w") as f:
+        json.dump(wrapped_data, f, indent=2)
+    return output_path
+
+
+def journal_path(output_dir):
+    """the job journal belongs to the output directory, e.g. generatedjson_journal.sqlite"""
+    return os.path.normpath(output_dir) + "_journal.sqlite"
+
+
+def telemetry_path(output_dir):
+    """the telemetry log of the runs into output_dir, e.g. generatedjson_telemetry.jsonl"""
+    return os.path.normpath(output_dir) + "_telemetry.jsonl"
+
+
+def list_pdfs(pdf_dir):
+    return sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+
+
+def evaluate_folder(pdf_dir, checklist_path, output_dir="generatedjson", api_key=None,
+                    policy="exclude", keywords=None, overwrite=False,
+                    workers=1, requests_per_minute=None, tokens_per_minute=None,
+                    cache_dir=DEFAULT_CACHE_DIR, refresh_cache=False, extraction_workers=1,
+                    stream=False, token_budget=DEFAULT_TOKEN_BUDGET, per_category=False,
+                    backend="gemini", model=None, backend_options=None, telemetry_log=None, top_k=DEFAULT_TOP_K,
+                    prescreen_criteria=False, include_references=False):
+    """Evaluate every PDF in pdf_dir with up to `workers` papers in flight.
+    A failing paper is reported and does not stop the run.
+    Responses are cached in cache_dir (None disables the cache), refresh_cache skips cache lookups.
+    With extraction_workers != 1 the PDFs are extracted up front in a process pool (None uses all cores).
+    stream=True streams the responses, repairable output is accepted like without streaming.
+    token_budget is the prompt size the "auto" policy plans for, top_k the passages per criterion of "retrieve".
+    prescreen_criteria=True decides obvious criteria (e.g. code links) without the LLM.
+    include_references=True extracts the papers with their references, by default extraction stops there.
+    per_category=True makes one smaller request per checklist category.
+    The state of every paper is kept in a job journal next to output_dir, a rerun skips the scored papers
+    and retries the failed and interrupted ones.
+    backend selects the LLM provider (see llmbackends.BACKENDS), backend_options are passed to it.
+    Telemetry events are appended to telemetry_log (by default next to output_dir) and summarized at the end."""
+    with open(checklist_path, "r") as f:
+        checklist = json.load(f)
+    api_key = api_key or os.environ.get("GEMINI_API_KEY")
+    backend = create_backend(backend, api_key, model, **(backend_options or {}))
+    cache = ResponseCache(cache_dir, bypass=refresh_cache) if cache_dir else None
+
+    journal = JobJournal(journal_path(output_dir))
+    telemetry = set_telemetry(Telemetry(telemetry_log or telemetry_path(output_dir)))
+
+    pending = []
+    for pdf_path in list_pdfs(pdf_dir):
+        file_id = os.path.splitext(os.path.basename(pdf_path))[0]
+        output_path = os.path.join(output_dir, f"{file_id}_evaluation.json")
+        if not overwrite and os.path.exists(output_path) and journal.state(file_id) in ("scored", None):
+            print(f"{file_id}: already evaluated, skipping")
+            continue
+        if journal.state(file_id) == "failed":
+            print(f"{file_id}: retrying, failed before ({journal.failures()[file_id]})")
+        pending.append((file_id, pdf_path))
+
+    if extraction_workers != 1:
+        extracted = get_default_cache().preload([pdf_path for _, pdf_path in pending],
+                                                section_extractor(include_references), workers=extraction_workers)
+        print(f"Extracted {extracted} PDFs")
+
+    saved = {}
+    failed = {}
+    with EvaluationScheduler(workers, requests_per_minute, tokens_per_minute) as scheduler:
+        futures = {}
+        for file_id, pdf_path in pending:
+            journal.start(file_id, pdf_path)
+            future = scheduler.submit(evaluate_pdf, pdf_path, checklist, backend, policy, keywords, scheduler, cache,
+                                      stream, token_budget, per_category, journal, top_k, prescreen_criteria,
+                                      include_references)
+            futures[future] = file_id
+        for future in as_completed(futures):
+            file_id = futures[future]
+            try:
+                wrapped_data = future.result()
+                saved[file_id] = save_evaluation(wrapped_data, output_dir)
+                with telemetry.paper(file_id), telemetry.span("score") as event:
+                    score, _ = evaluate_json(wrapped_data)
+                    event["score"] = score
+                journal.record(file_id, "scored", output_path=saved[file_id], score=score)
+                print(f"{file_id}: saved JSON to {saved[file_id]}")
+            except Exception as e:
+                failed[file_id] = str(e)
+                journal.fail(file_id, f"{type(e).__name__}: {e}")
+                print(f"{file_id}: failed ({e})")
+            depth = scheduler.queue_depth()
+            print(f"[{len(saved) + len(failed)}/{len(pending)}] queued: {depth['queued']}, "
+                  f"running: {depth['running']}, retries: {depth['retries']}")
+
+    print(f"Evaluated: {len(saved)}, failed: {len(failed)}")
+    print(f"Journal: {journal.summary()}")
+    journal.close()
+    if cache is not None:
+        print(f"Response cache: {cache.stats()}")
+    backend.close()
+    telemetry.metrics.report()
+    print(f"Telemetry log: {telemetry.log_path}")
+    telemetry.close()
+    return saved, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a folder of papers without the GUI")
+    parser.add_argument("pdf_dir", nargs="?", default="lakproceedings")
+    parser.add_argument("--checklist", default="checklist.json")
+    parser.add_argument("--output", default="generatedjson")
+    parser.add_argument("--policy", choices=SELECTION_POLICIES, default="exclude",
+                        help="how sections are selected instead of checkbox clicks, auto plans them under --token-budget, "
+                             "retrieve sends only the best passages per criterion")
+    parser.add_argument("--keyword", action="append", dest="keywords",
+                        help="section title keyword for the exclude/include policy, can be repeated")
+    parser.add_argument("--overwrite", action="store_true", help="re-evaluate papers that already have a JSON")
+    parser.add_argument("--workers", type=int, default=1, help="number of evaluations in flight")
+    parser.add_argument("--rpm", type=int, default=None, help="requests per minute budget")
+    parser.add_argument("--tpm", type=int, default=None, help="input tokens per minute budget")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="directory of the response cache")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the response cache")
+    parser.add_argument("--refresh-cache", action="store_true", help="ignore cached responses but store the new ones")
+    parser.add_argument("--extract-workers", type=int, default=1,
+                        help="processes for PDF text extraction, 0 uses all cores")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="estimated prompt tokens per request for the auto policy")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K,
+                        help="passages per checklist criterion for the retrieve policy")
+    parser.add_argument("--prescreen", action="store_true",
+                        help="decide criteria with clear signals (repository links, no preregistration) without the LLM")
+    parser.add_argument("--include-references", action="store_true",
+                        help="extract the references too, by default extraction stops at the references")
+    parser.add_argument("--per-category", action="store_true",
+                        help="one request per checklist category with only its relevant sections")
+    parser.add_argument("--stream", action="store_true", help="stream the responses")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="gemini",
+                        help="LLM provider, stub answers offline with simulated latency and errors")
+    parser.add_argument("--telemetry", default=None,
+                        help="JSONL file the run events are appended to, default <output>_telemetry.jsonl")
+    parser.add_argument("--model", default=None, help="model name for the backend instead of its default")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="gemini: register the instructions and checklist once as cached content")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds per request of the stub backend")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0,
+                        help="fraction of stub requests failing with a retryable error")
+    args = parser.parse_args()
+    if args.token_budget < 1:
+        parser.error("--token-budget must be at least 1")
+    if args.top_k < 1:
+        parser.error("--top-k must be at least 1")
+
+    backend_options = {}
+    if args.backend == "stub":
+        backend_options = {"latency": args.stub_latency, "error_rate": args.stub_error_rate}
+    elif args.backend == "gemini" and args.context_cache:
+        backend_options = {"context_cache": True}
+
+    evaluate_folder(args.pdf_dir, args.checklist, args.output,
+                    policy=args.policy, keywords=args.keywords, overwrite=args.overwrite,
+                    workers=args.workers, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                    cache_dir=None if args.no_cache else args.cache_dir, refresh_cache=args.refresh_cache,
+                    extraction_workers=args.extract_workers or None, stream=args.stream,
+                    token_budget=args.token_budget, per_category=args.per_category,
+                    backend=args.backend, model=args.model, backend_options=backend_options,
+                    telemetry_log=args.telemetry, top_k=args.top_k,
+                    prescreen_criteria=args.prescreen, include_references=args.include_references)
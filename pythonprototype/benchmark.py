@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+from pypdf import PdfReader
+from pdfextraction import extract_sections_using_bookmarks
+from llmbackends import StubBackend, build_prompt
+from responseparser import extract_json_from_response, parse_evaluation
+from jsonscorer import evaluate_json
+from corpusscorer import load_corpus
+from batchchecker import select_sections, list_pdfs
+
+DEFAULT_RESULTS_DIR = "benchmarks"
+
+# a stage that got this much slower (p50) than in the compared run is reported as a regression,
+# changes below REGRESSION_MIN_MS are timer noise
+REGRESSION_THRESHOLD = 0.10
+REGRESSION_MIN_MS = 0.5
+
+
+class StageTimer:
+    """Collects one latency sample per call of stage(), and if tracemalloc is running the peak memory
+    allocated on top of what was allocated when the stage started"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.peaks = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+            if tracing:
+                self.peaks[name] = max(self.peaks[name], tracemalloc.get_traced_memory()[1] - baseline)
+
+
+def run_pipeline(pdf_paths, json_paths, checklist, backend, timer):
+    """every stage of a batch run for each PDF, then scoring of the existing evaluation JSON files"""
+    for pdf_path in pdf_paths:
+        with timer.stage("load"):
+            reader = PdfReader(pdf_path)
+            len(reader.pages)
+        with timer.stage("extract"):
+            sections = extract_sections_using_bookmarks(reader)
+        with timer.stage("render"):
+            text = "\n\n".join(sections[title] for title in select_sections(sections))
+            build_prompt(text, checklist)
+        with timer.stage("llm"):
+            response = backend.generate(text, checklist)
+        with timer.stage("extract_json"):
+            extract_json_from_response(response)
+        with timer.stage("parse"):
+            parse_evaluation(response, checklist)
+
+    for json_path in json_paths:
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with timer.stage("score"):
+            evaluate_json(data)
+
+    if json_paths:
+        with timer.stage("score_corpus"):
+            load_corpus(sorted({os.path.dirname(path) for path in json_paths}))
+
+
+def summarize(timer):
+    stages = {}
+    for name, samples in timer.samples.items():
+        samples = np.array(samples)
+        stages[name] = {
+            "count": len(samples),
+            "total_s": float(samples.sum()),
+            "mean_ms": float(samples.mean() * 1000),
+            "p50_ms": float(np.percentile(samples, 50) * 1000),
+            "p90_ms": float(np.percentile(samples, 90) * 1000),
+            "p99_ms": float(np.percentile(samples, 99) * 1000),
+            "max_ms": float(samples.max() * 1000),
+            "per_second": float(len(samples) / samples.sum()) if samples.sum() else None,
+        }
+    return stages
+
+
+def print_report(result):
+    print(f"{'stage':<14}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'per s':>10}{'peak MB':>10}")
+    for name, stage in result["stages"].items():
+        peak = stage.get("peak_mb")
+        print(f"{name:<14}{stage['count']:>7}{stage['p50_ms']:>10.1f}{stage['p90_ms']:>10.1f}{stage['p99_ms']:>10.1f}"
+              f"{stage['max_ms']:>10.1f}{stage['per_second'] or 0:>10.1f}{'' if peak is None else f'{peak:.1f}':>10}")
+    print(f"{result['papers']} papers in {result['wall_s']:.1f}s ({result['papers_per_second']:.2f} papers/s), "
+          f"process peak RSS {result['max_rss_mb']:.0f} MB")
+
+
+def compare(result, baseline_path):
+    """print the p50 change of every stage against an earlier result file"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"Compared to {baseline_path}:")
+    regressions = []
+    for name, stage in result["stages"].items():
+        before = baseline["stages"].get(name)
+        if not before or not before["p50_ms"]:
+            continue
+        change = stage["p50_ms"] / before["p50_ms"] - 1
+        slower = stage["p50_ms"] - before["p50_ms"] > REGRESSION_MIN_MS
+        marker = "  REGRESSION" if change > REGRESSION_THRESHOLD and slower else ""
+        print(f"  {name:<14}{before['p50_ms']:>10.1f} -> {stage['p50_ms']:>10.1f} ms ({change:+.0%}){marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def run_benchmark(pdf_dir="lakproceedings", json_dir="generatedjson", checklist_path="checklist.json",
+                  limit=None, latency=0.0, memory_papers=3):
+    """Time all stages over the corpus. Peak memory per stage is measured in a second pass over
+    the first memory_papers papers, tracemalloc slows everything down and would distort the latencies."""
+    with open(checklist_path, "r") as f:
+        checklist = json.load(f)
+    pdf_paths = list_pdfs(pdf_dir)[:limit]
+    json_paths = sorted(os.path.join(json_dir, name) for name in os.listdir(json_dir) if name.endswith(".json"))
+    backend = StubBackend(latency=latency)
+
+    timer = StageTimer()
+    start = time.perf_counter()
+    run_pipeline(pdf_paths, json_paths, checklist, backend, timer)
+    wall = time.perf_counter() - start
+    stages = summarize(timer)
+
+    if memory_papers:
+        memory_timer = StageTimer()
+        tracemalloc.start()
+        try:
+            run_pipeline(pdf_paths[:memory_papers], json_paths[:memory_papers], checklist, backend, memory_timer)
+        finally:
+            tracemalloc.stop()
+        for name, peak in memory_timer.peaks.items():
+            stages[name]["peak_mb"] = peak / 1024 / 1024
+
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pdf_dir": pdf_dir,
+        "json_dir": json_dir,
+        "papers": len(pdf_paths),
+        "evaluations": len(json_paths),
+        "stub_latency_s": latency,
+        "wall_s": wall,
+        "papers_per_second": len(pdf_paths) / wall if wall else 0,
+        "max_rss_mb": max_rss_mb(),
+        "stages": stages,
+    }
+
+
+def save_result(result, results_dir=DEFAULT_RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"benchmark_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results saved to: {path}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages with the stub LLM backend")
+    parser.add_argument("pdf_dir", nargs="?", default="lakproceedings")
+    parser.add_argument("--json-dir", default="generatedjson", help="evaluations for the scoring stages")
+    parser.add_argument("--checklist", default="checklist.json")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N papers")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per LLM call")
+    parser.add_argument("--memory-papers", type=int, default=3,
+                        help="papers of the separate peak memory pass, 0 skips it")
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--compare", help="earlier result file to compare the p50 latencies with")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.pdf_dir, args.json_dir, args.checklist, args.limit, args.latency, args.memory_papers)
+    print_report(result)
+    save_result(result, args.results_dir)
+    if args.compare and compare(result, args.compare):
+        sys.exit(1)
@@ -0,0 +1,181 @@
+import os
+import csv
+import numpy as np
+from evaluationmodel import default_checklist
+from scoringrules import default_rubric, load_rubrics
+
+
+def status_mask(record, status="Met"):
+    """bitmask of the criteria that have exactly this status"""
+    mask = 0
+    for index, value in enumerate(record.statuses):
+        if value == status:
+            mask |= 1 << index
+    return mask
+
+
+def mask_array(masks, checklist):
+    # bitmasks of up to 62 criteria fit into int64, larger checklists fall back to python ints
+    dtype = np.int64 if len(checklist.criteria) <= 62 else object
+    return np.array(masks, dtype=dtype)
+
+
+def write_csv(output_csv, header, rows):
+    with open(output_csv, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+class RubricScores:
+    """verdict, score and reproducible columns of one rubric variant"""
+
+    def __init__(self, rubric, met):
+        self.rubric = rubric
+        self.verdicts = {category_name: np.asarray(verdict, dtype=bool)
+                         for category_name, verdict in rubric.verdicts(met).items()}
+        self.score = np.zeros(len(met), dtype=np.int64)
+        for rule in rubric.rules:
+            self.score += self.verdicts[rule.category] * rule.weight
+        self.reproducible = rubric.is_reproducible(self.score)
+
+
+class ScoreTable:
+    """Scores of a whole corpus in columnar form, one row per paper.
+
+    met, present and exact_met are arrays of criterion bitmasks (see EvaluationRecord).
+    Every rubric (see scoringrules) is applied to all rows at once, the first one gives the
+    score, reproducible and category columns, the others add score_<name> / reproducible_<name>.
+    skipped lists the (path, error) of the evaluation files that could not be scored.
+    """
+
+    def __init__(self, checklist, ids, sources, met, present, exact_met, rubrics=None, skipped=()):
+        self.checklist = checklist
+        self.ids = ids
+        self.sources = sources
+        # evaluation files that could not be scored, they have no row
+        self.skipped = list(skipped)
+        self.met = mask_array(met, checklist)
+        self.present = mask_array(present, checklist)
+        self.exact_met = mask_array(exact_met, checklist)
+
+        if rubrics is None:
+            default = checklist is default_checklist()
+            rubrics = [default_rubric() if default else load_rubrics(checklist=checklist)["default"]]
+        elif isinstance(rubrics, dict):
+            rubrics = list(rubrics.values())
+        self.rubrics = {rubric.name: RubricScores(rubric, self.met) for rubric in rubrics}
+
+        primary = next(iter(self.rubrics.values()))
+        self.verdicts = primary.verdicts
+        self.score = primary.score
+        self.reproducible = primary.reproducible
+
+    def __len__(self):
+        return len(self.ids)
+
+    def criterion_matrix(self, masks=None):
+        """papers x criteria boolean status matrix"""
+        masks = self.met if masks is None else masks
+        bits = np.array([criterion.bit for criterion in self.checklist.criteria], dtype=masks.dtype)
+        return (masks[:, None] & bits[None, :]) != 0
+
+    def columns(self, include_criteria=False):
+        columns = {
+            "id": self.ids,
+            "score": self.score,
+            "reproducible": np.where(self.reproducible, "yes", "no"),
+        }
+        for category_name, verdict in self.verdicts.items():
+            columns[category_name] = np.where(verdict, "Met", "Not Met")
+        for name, scores in list(self.rubrics.items())[1:]:
+            columns[f"score_{name}"] = scores.score
+            columns[f"reproducible_{name}"] = np.where(scores.reproducible, "yes", "no")
+        if include_criteria:
+            matrix = self.criterion_matrix()
+            present = self.criterion_matrix(self.present)
+            for criterion in self.checklist.criteria:
+                column = np.where(matrix[:, criterion.index], "Met", "Not Met")
+                columns[f"{criterion.category}: {criterion.name}"] = np.where(present[:, criterion.index], column, "")
+        return columns
+
+    def rows(self, include_criteria=False):
+        """header and the rows of the CSV"""
+        columns = self.columns(include_criteria)
+        rows = zip(*(column.tolist() if hasattr(column, "tolist") else column for column in columns.values()))
+        return list(columns), [list(row) for row in rows]
+
+    def save_csv(self, output_csv, include_criteria=False):
+        header, rows = self.rows(include_criteria)
+        write_csv(output_csv, header, rows)
+        print(f"Results saved to: {output_csv}")
+
+    def upsert_csv(self, output_csv, changed_ids, removed_ids=(), include_criteria=False):
+        """Update an existing results CSV in place: rows of changed ids are replaced (or appended),
+        rows of removed ids dropped and all other rows kept as they are.
+        Without a CSV or with other columns (e.g. another rubric) the whole table is written."""
+        header, rows = self.rows(include_criteria)
+        if not os.path.exists(output_csv):
+            return self.save_csv(output_csv, include_criteria)
+        with open(output_csv, "r", newline="", encoding="utf-8") as csvfile:
+            existing = list(csv.reader(csvfile))
+        if not existing or existing[0] != header:
+            return self.save_csv(output_csv, include_criteria)
+
+        by_id = {row[0]: row for row in rows}
+        updates = {file_id: by_id[file_id] for file_id in changed_ids if file_id in by_id}
+        removed = set(removed_ids) - set(updates)
+        kept = []
+        for row in existing[1:]:
+            if row[0] in removed:
+                continue
+            kept.append(updates.pop(row[0], row))
+        kept.extend(updates.values())
+        write_csv(output_csv, header, kept)
+        print(f"Results updated in: {output_csv} ({len(changed_ids)} changed, {len(removed)} removed)")
+
+    def save_parquet(self, output_path, include_criteria=True):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise RuntimeError("Saving as Parquet needs pandas and pyarrow (pip install pandas pyarrow)")
+        pd.DataFrame(self.columns(include_criteria)).to_parquet(output_path, index=False)
+        print(f"Results saved to: {output_path}")
+
+    def justified_closed_counts(self):
+        """papers that justify not sharing data / code ("Open Data 2" / "Open Source Code 2" are "Met")"""
+        data = self.checklist.category("Data Accessibility & Transparency").criterion("Open Data 2").bit
+        code = self.checklist.category("Code & Software Availability").criterion("Open Source Code 2").bit
+        return {
+            "data": [self.ids[i] for i in np.flatnonzero((self.exact_met & data) != 0)],
+            "code": [self.ids[i] for i in np.flatnonzero((self.exact_met & code) != 0)],
+        }
+
+
+def load_corpus(directories, checklist=None, rubrics=None):
+    """Read every *_evaluation JSON of the directories once and build the ScoreTable.
+    rubrics is a list or dict of compiled rubrics, by default the "default" rubric of scoringrules.json.
+    A file that is no valid evaluation is reported and skipped, it does not stop the corpus."""
+    if isinstance(directories, str):
+        directories = [directories]
+    checklist = checklist or default_checklist()
+
+    ids, sources, met, present, exact_met, skipped = [], [], [], [], [], []
+    for directory in directories:
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            filepath = os.path.join(directory, filename)
+            try:
+                record = checklist.load(filepath)
+            except ValueError as e:
+                print(f"{filepath}: skipped ({e})")
+                skipped.append((filepath, str(e)))
+                continue
+            ids.append(record.id)
+            sources.append(filepath)
+            met.append(record.met)
+            present.append(record.present)
+            exact_met.append(status_mask(record))
+    return ScoreTable(checklist, ids, sources, met, present, exact_met, rubrics, skipped)
+
@@ -0,0 +1,160 @@
+import os
+import json
+
+DEFAULT_CHECKLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checklist.json")
+
+NOT_MET = "Not Met"
+
+
+def normalize_name(name):
+    """criterion and category names are matched case and whitespace insensitive"""
+    return " ".join(str(name).split()).lower()
+
+
+class Criterion:
+    __slots__ = ("name", "description", "category", "index")
+
+    def __init__(self, name, description, category, index):
+        self.name = name
+        self.description = description
+        self.category = category
+        self.index = index
+
+    @property
+    def bit(self):
+        return 1 << self.index
+
+    def __repr__(self):
+        return f"Criterion({self.name!r}, bit {self.index})"
+
+
+class Category:
+    __slots__ = ("name", "criteria", "mask")
+
+    def __init__(self, name, criteria):
+        self.name = name
+        self.criteria = criteria
+        self.mask = 0
+        for criterion in criteria:
+            self.mask |= criterion.bit
+
+    def criterion(self, name):
+        key = normalize_name(name)
+        for criterion in self.criteria:
+            if normalize_name(criterion.name) == key:
+                return criterion
+        raise KeyError(f"{self.name} has no criterion {name!r}")
+
+    def __repr__(self):
+        return f"Category({self.name!r}, {len(self.criteria)} criteria)"
+
+
+class EvaluationRecord:
+    """One evaluated paper in compact form.
+
+    met has bit i set if criterion i of the checklist is not "Not Met" (the rule jsonscorer uses),
+    present has bit i set if the LLM output contained criterion i at all.
+    Statuses and justifications are kept per criterion index in checklist order.
+    """
+    __slots__ = ("id", "met", "present", "statuses", "justifications")
+
+    def __init__(self, file_id, met, present, statuses, justifications):
+        self.id = file_id
+        self.met = met
+        self.present = present
+        self.statuses = statuses
+        self.justifications = justifications
+
+    def status(self, criterion):
+        return self.statuses[criterion.index]
+
+    def __repr__(self):
+        return f"EvaluationRecord({self.id!r}, met={self.met:#x}, present={self.present:#x})"
+
+
+class Checklist:
+    """Checklist built once from checklist.json, every criterion gets a fixed bit position.
+    normalize() maps LLM output onto it by name, so the order of the output does not matter."""
+
+    def __init__(self, data):
+        self.categories = []
+        self.criteria = []
+        self._by_name = {}
+        for category_data in data:
+            criteria = []
+            for criterion_data in category_data["criteria"]:
+                criterion = Criterion(criterion_data["name"], criterion_data.get("description", ""),
+                                      category_data["category"], len(self.criteria))
+                criteria.append(criterion)
+                self.criteria.append(criterion)
+                key = (normalize_name(category_data["category"]), normalize_name(criterion.name))
+                if key in self._by_name:
+                    raise ValueError(f"Duplicate criterion in checklist: {criterion.name}")
+                self._by_name[key] = criterion
+            self.categories.append(Category(category_data["category"], criteria))
+        self._categories = {normalize_name(category.name): category for category in self.categories}
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_CHECKLIST_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def category(self, name):
+        return self._categories[normalize_name(name)]
+
+    @property
+    def full_mask(self):
+        return (1 << len(self.criteria)) - 1
+
+    def normalize(self, data):
+        """Validate an evaluation ({"id", "evaluation"} or the bare list) and turn it into an EvaluationRecord.
+        Malformed evaluations and categories or criteria that are not in the checklist raise ValueError,
+        missing ones stay unset."""
+        file_id = data.get("id") if isinstance(data, dict) else None
+        evaluation = data.get("evaluation") if isinstance(data, dict) else data
+        if not isinstance(evaluation, list):
+            raise ValueError(f"{file_id}: evaluation is not a list of categories")
+
+        met = 0
+        present = 0
+        statuses = [None] * len(self.criteria)
+        justifications = [None] * len(self.criteria)
+        for category_data in evaluation:
+            if not isinstance(category_data, dict) or not isinstance(category_data.get("results", []), list):
+                raise ValueError(f"{file_id}: malformed category {str(category_data)[:100]}")
+            category_key = normalize_name(category_data.get("category"))
+            if category_key not in self._categories:
+                raise ValueError(f"{file_id}: unknown category {category_data.get('category')!r}")
+            for result in category_data.get("results", []):
+                if not isinstance(result, dict):
+                    raise ValueError(f"{file_id}: malformed result {str(result)[:100]}")
+                criterion = self._by_name.get((category_key, normalize_name(result.get("criterion"))))
+                if criterion is None:
+                    raise ValueError(f"{file_id}: unknown criterion {result.get('criterion')!r} "
+                                     f"in {category_data['category']!r}")
+                status = result.get("status")
+                present |= criterion.bit
+                if status != NOT_MET:
+                    met |= criterion.bit
+                statuses[criterion.index] = status
+                justifications[criterion.index] = result.get("justification")
+        return EvaluationRecord(file_id, met, present, tuple(statuses), tuple(justifications))
+
+    def load(self, path):
+        """read and normalize one evaluation file, a file that is no valid evaluation raises ValueError"""
+        with open(path, "r", encoding="utf-8") as file:
+            return self.normalize(json.load(file))
+
+    def __repr__(self):
+        return f"Checklist({len(self.categories)} categories, {len(self.criteria)} criteria)"
+
+
+_default_checklist = None
+
+
+def default_checklist():
+    """the Checklist of checklist.json next to this module, loaded once"""
+    global _default_checklist
+    if _default_checklist is None:
+        _default_checklist = Checklist.from_file()
+    return _default_checklist
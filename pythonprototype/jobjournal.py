@@ -0,0 +1,84 @@
+import time
+import sqlite3
+import threading
+
+# states of a paper in the order they are reached, "failed" can follow any of them
+STATES = ["pending", "extracted", "prompted", "parsed", "scored"]
+FAILED = "failed"
+
+
+class JobJournal:
+    """Durable record of a batch run in SQLite.
+
+    jobs holds the current state of every paper, events is an append-only log of all state changes.
+    Every change is committed at once, so an interrupted run can be resumed with the papers that are not scored yet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                pdf_path TEXT,
+                state TEXT NOT NULL,
+                reason TEXT,
+                output_path TEXT,
+                score INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                reason TEXT,
+                time REAL NOT NULL
+            );
+        """)
+        self.connection.commit()
+
+    def start(self, file_id, pdf_path):
+        """register a new attempt for the paper"""
+        now = time.time()
+        with self.lock:
+            self.connection.execute("""
+                INSERT INTO jobs (id, pdf_path, state, attempts, updated_at) VALUES (?, ?, 'pending', 1, ?)
+                ON CONFLICT(id) DO UPDATE SET pdf_path = excluded.pdf_path, state = 'pending', reason = NULL,
+                    attempts = attempts + 1, updated_at = excluded.updated_at
+            """, (file_id, pdf_path, now))
+            self.connection.execute("INSERT INTO events VALUES (?, 'pending', NULL, ?)", (file_id, now))
+            self.connection.commit()
+
+    def record(self, file_id, state, reason=None, output_path=None, score=None):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("""
+                UPDATE jobs SET state = ?, reason = ?, output_path = COALESCE(?, output_path),
+                    score = COALESCE(?, score), updated_at = ? WHERE id = ?
+            """, (state, reason, output_path, score, now, file_id))
+            self.connection.execute("INSERT INTO events VALUES (?, ?, ?, ?)", (file_id, state, reason, now))
+            self.connection.commit()
+
+    def fail(self, file_id, reason):
+        self.record(file_id, FAILED, reason=reason)
+
+    def state(self, file_id):
+        with self.lock:
+            row = self.connection.execute("SELECT state FROM jobs WHERE id = ?", (file_id,)).fetchone()
+        return row[0] if row else None
+
+    def is_done(self, file_id):
+        return self.state(file_id) == "scored"
+
+    def failures(self):
+        with self.lock:
+            return dict(self.connection.execute("SELECT id, reason FROM jobs WHERE state = ?", (FAILED,)))
+
+    def summary(self):
+        """number of papers per state"""
+        with self.lock:
+            return dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+
+    def close(self):
+        self.connection.close()
@@ -1,64 +1,54 @@
 import json
 import os
 import csv
-
-
-def evaluate_json(data):
-    score = 0
+from evaluationmodel import default_checklist
+from scoringrules import default_rubric, load_rubrics
+
+
+def evaluate_json(data, checklist=None, rubric=None):
+    """Score one evaluation. Criteria are matched by name through the checklist model,
+    so the order of categories and criteria in the LLM output does not matter.
+    The category rules come from scoringrules.json (the "default" rubric unless another one is given)."""
+    if checklist is None:
+        checklist = default_checklist()
+        rubric = rubric or default_rubric()
+    else:
+        rubric = rubric or load_rubrics(checklist=checklist)["default"]
+    record = checklist.normalize(data)
     category_statuses = {}
-    for category in data["evaluation"]:
-        category_name = category["category"]
-        criteria = category["results"]
-        if category_name == "Type of Analysis":
-            if any(result["status"] != "Not Met" for result in criteria):
-                score += 1
-                category_statuses[category_name] = "Met"
-            else:
-                category_statuses[category_name] = "Not Met"
-
-        elif category_name == "Data Accessibility & Transparency":
-            required_criterion_idx = [0]
-            if all(criteria[i]["status"] != "Not Met" for i in required_criterion_idx):
-                score += 1
-                category_statuses[category_name] = "Met"
-            else:
-                category_statuses[category_name] = "Not Met"
-
-        elif category_name == "Code & Software Availability":
-            required_criterion_idx = [0]
-            if all(criteria[i]["status"] != "Not Met" for i in required_criterion_idx):
-                score += 1
-                category_statuses[category_name] = "Met"
-            else:
-                category_statuses[category_name] = "Not Met"
-
-        elif category_name == "Preregistration":
-            if all(result["status"] != "Not Met" for result in criteria):
-                category_statuses[category_name] = "Met"
-            else:
-                category_statuses[category_name] = "Not Met"
-
-        else:
-            if all(result["status"] != "Not Met" for result in criteria):
-                score += 1
-                category_statuses[category_name] = "Met"
-            else:
-                category_statuses[category_name] = "Not Met"
-
-    return score, category_statuses
-
-def evaluate_all_json(directory):
+    verdicts = rubric.verdicts(record.met)
+    for category_name, verdict in verdicts.items():
+        category_statuses[category_name] = "Met" if verdict else "Not Met"
+
+    return rubric.score(verdicts), category_statuses
+
+def load_evaluation(filepath, checklist=None):
+    """the evaluation JSON of the file, None (reported) if it can't be read or scored"""
+    try:
+        with open(filepath, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        (checklist or default_checklist()).normalize(data)
+    except ValueError as e:
+        print(f"{filepath}: skipped ({e})")
+        return None
+    return data
+
+def evaluate_all_json(directory, rubric=None):
+    rubric = rubric or default_rubric()
     results = []
+    skipped = 0
     for filename in os.listdir(directory):
         if filename.endswith(".json"):
             filepath = os.path.join(directory, filename)
-            with open(filepath, "r", encoding="utf-8") as file:
-                data = json.load(file)
+            data = load_evaluation(filepath)
+            if data is None:
+                skipped += 1
+                continue
 
             file_id = data["id"]
-            score, category_statuses = evaluate_json(data)
+            score, category_statuses = evaluate_json(data, rubric=rubric)
 
-            if score == 5:
+            if rubric.is_reproducible(score):
                 reproducible = "yes"
             else:
                 reproducible = "no"
@@ -68,6 +58,8 @@ def evaluate_all_json(directory):
                 row.append(category_statuses[category])
 
             results.append((row, category_statuses))
+    if skipped:
+        print(f"Skipped evaluation files: {skipped}")
     return results
 
 def save_as_csv(output_csv, results):
@@ -81,40 +73,84 @@ def save_as_csv(output_csv, results):
             writer.writerow(row)
     print(f"Results saved to: {output_csv}")
 
-def justified_closed_data_json(directory):
+def justified_closed_data_json(directory, checklist=None):
+    checklist = checklist or default_checklist()
+    data_justification = checklist.category("Data Accessibility & Transparency").criterion("Open Data 2")
+    code_justification = checklist.category("Code & Software Availability").criterion("Open Source Code 2")
     data_justified_count = 0
     code_justified_count = 0
     for filename in os.listdir(directory):
         if filename.endswith(".json"):
             filepath = os.path.join(directory, filename)
-            with open(filepath, "r", encoding="utf-8") as file:
-                data = json.load(file)
-
-            for category in data["evaluation"]:
-                category_name = category["category"]
-                criteria = category["results"]
-                if category_name == "Data Accessibility & Transparency":
-                    if criteria[1]["status"] == "Met":
-                        print("Justified Data not shared:")
-                        print(data["id"])
-                        data_justified_count +=1
-
-                elif category_name == "Code & Software Availability":
-                    if category_name == "Data Accessibility & Transparency":
-                        if criteria[1]["status"] == "Met":
-                            print("Justified Code not shared:")
-                            print(data["id"])
-                            code_justified_count += 1
+            data = load_evaluation(filepath, checklist)
+            if data is None:
+                continue
+
+            record = checklist.normalize(data)
+            if record.status(data_justification) == "Met":
+                print("Justified Data not shared:")
+                print(data["id"])
+                data_justified_count +=1
+
+            if record.status(code_justification) == "Met":
+                print("Justified Code not shared:")
+                print(data["id"])
+                code_justified_count += 1
 
     print(f"Data not shared justified: {data_justified_count}")
     print(f"Code not shared justified: {code_justified_count}")
 
 
 if __name__ == "__main__":
-    folder_path = "generatedjson"
-    output_csv_path = "complete_evaluation_results_2.csv"
-
-    results = evaluate_all_json(folder_path)
-    save_as_csv(output_csv_path, results)
-
-    justified_closed_data_json(folder_path)
+    import argparse
+    from corpusscorer import load_corpus
+    from scoremanifest import ScoreManifest, DEFAULT_MANIFEST_PATH
+
+    parser = argparse.ArgumentParser(description="Score the evaluation JSON files into a CSV or Parquet table")
+    parser.add_argument("--folder", default="generatedjson", help="folder with the *_evaluation.json files")
+    parser.add_argument("--output", default=None, help="results file, default complete_evaluation_results_2.<format>")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="parquet also has a column per criterion, it needs pandas and pyarrow")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only parse new or changed files and update the results CSV in place")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH, help="manifest of the scored files (--incremental)")
+    args = parser.parse_args()
+    output = args.output or f"complete_evaluation_results_2.{args.format}"
+
+    # every evaluation is read once into a columnar table and scored for all papers at once,
+    # under every rubric variant of scoringrules.json
+    rubrics = load_rubrics()
+    if args.incremental:
+        manifest = ScoreManifest(args.manifest)
+        changed, removed = manifest.update(args.folder)
+        rubrics_changed = manifest.rubrics_changed(rubrics)
+        table = manifest.table(rubrics)
+        manifest.close()
+    else:
+        table = load_corpus(args.folder, rubrics=rubrics)
+
+    if args.format == "parquet":
+        # Parquet is always written as a whole, --incremental still only parses the changed files
+        try:
+            table.save_parquet(output)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+    elif args.incremental and not rubrics_changed:
+        table.upsert_csv(output, changed, removed)
+    else:
+        # without --incremental, or other weights or rules change the score of every paper
+        table.save_csv(output)
+
+    justified = table.justified_closed_counts()
+    for file_id in justified["data"]:
+        print("Justified Data not shared:")
+        print(file_id)
+    for file_id in justified["code"]:
+        print("Justified Code not shared:")
+        print(file_id)
+    print(f"Data not shared justified: {len(justified['data'])}")
+    print(f"Code not shared justified: {len(justified['code'])}")
+    if table.skipped:
+        print(f"Skipped evaluation files: {len(table.skipped)}")
+        for filepath, error in table.skipped:
+            print(f"  {filepath}: {error}")
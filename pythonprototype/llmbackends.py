@@ -0,0 +1,508 @@
+import json
+import time
+import random
+import hashlib
+import threading
+import httpx
+from google import genai
+from google.genai import types
+from responsecache import cache_key
+from sectionplanner import estimate_tokens
+from telemetry import get_telemetry
+
+MODEL = "gemma-3-27b-it"
+
+# settings for generate_content, also part of the response cache key
+GENERATION_CONFIG = {
+    "temperature": 0,
+    "response_mime_type": "text/plain",
+}
+
+OLLAMA_MODEL = "gemma3:12b"
+
+
+# the static part of every prompt, the document comes last so the whole prefix can be reused
+PROMPT_INSTRUCTIONS = """Evaluate the document at the end of this prompt with respect to the checklist criteria below.
+
+Checklist (JSON):
+<checklist>
+
+For each checklist item, provide:
+- `criterion`: the name of the checklist item
+- `status`: one of "Met", "Not Met"
+- `justification`: a short explanation of where or why the criterion is (not) met (e.g., section title, paragraph context, or quote)
+
+Output format:
+Return only valid JSON, structured like this:
+[
+  {
+    "category": "Open Methodology & Documentation",
+    "results": [
+      {
+        "criterion": "...",
+        "status": "Met" | "Not Met",
+        "justification": "..."
+      }
+    ]
+  },
+  ...
+]
+Do not include any explanation or commentary outside the JSON.
+"""
+
+_prefixes = {}
+_prefixes_lock = threading.Lock()
+
+
+def canonical_checklist(checklist):
+    """the checklist as compact JSON, the same checklist always gives the same text"""
+    return json.dumps(checklist, separators=(",", ":"), ensure_ascii=False)
+
+
+def build_prefix(checklist):
+    """instructions and checklist, rendered once per checklist and reused for every paper"""
+    key = canonical_checklist(checklist)
+    with _prefixes_lock:
+        prefix = _prefixes.get(key)
+        if prefix is None:
+            prefix = _prefixes[key] = PROMPT_INSTRUCTIONS.replace("<checklist>", key)
+        return prefix
+
+
+def build_document(pdf_text):
+    return f'\nDocument:\n"""{pdf_text}"""\n'
+
+
+def build_prompt(pdf_text, checklist):
+    return build_prefix(checklist) + build_document(pdf_text)
+
+
+def build_contents(prompt):
+    return [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=prompt),
+            ],
+        ),
+    ]
+
+
+# one long-lived client per API key so all evaluations share its HTTP connection pool
+_clients = {}
+_clients_lock = threading.Lock()
+MAX_CONNECTIONS = 10
+
+
+def get_client(api_key):
+    """return the shared genai client for this API key, created on first use"""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+            client = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(client_args={"limits": limits}),
+            )
+            _clients[api_key] = client
+        return client
+
+
+class Backend:
+    """An LLM provider. All providers share build_prompt and the response cache,
+    a provider only implements complete() and, if it can, stream().
+    Every request is reported as an "llm" telemetry event, with the exact token counts if the
+    provider passes them to report_usage(), estimated otherwise."""
+
+    name = None
+
+    def __init__(self, model, config):
+        self.model = model
+        self.config = config
+        self._usage = threading.local()
+
+    def report_usage(self, input_tokens, output_tokens):
+        """called by complete()/stream() with the token counts the API returned"""
+        self._usage.value = (input_tokens, output_tokens)
+
+    def close(self):
+        """release what the backend holds on the provider side (e.g. cached contexts)"""
+
+    def _emit(self, event, prompt, text, cached):
+        usage, self._usage.value = getattr(self._usage, "value", None), None
+        if cached or text is None:
+            usage = (0, 0)
+        elif usage is None or None in usage:
+            usage = (estimate_tokens(prompt), estimate_tokens(text))
+        event.update(backend=self.name, model=self.model, cached=cached,
+                     input_tokens=usage[0], output_tokens=usage[1])
+
+    def cache_model(self):
+        return f"{self.name}:{self.model}"
+
+    def complete(self, prefix, document, checklist):
+        """answer for the prompt prefix + document, the prefix is the same for every paper of a run"""
+        raise NotImplementedError
+
+    def stream(self, prefix, document, checklist):
+        yield self.complete(prefix, document, checklist)
+
+    def generate(self, pdf_text, checklist, cache=None, validate=None):
+        """make the LLM request, with a ResponseCache the cached response is returned if the same request was made before.
+        validate (e.g. the parser) is called with the response and raises ValueError for unusable output,
+        only validated responses are stored and a cached one that fails is requested again"""
+        prefix = build_prefix(checklist)
+        document = build_document(pdf_text)
+        prompt = prefix + document
+        with get_telemetry().span("llm") as event:
+            if cache is not None:
+                key = cache_key(self.cache_model(), prompt, checklist, self.config)
+                cached = valid_cached(cache.get(key), validate)
+                if cached is not None:
+                    self._emit(event, prompt, cached, True)
+                    return cached
+
+            text = None
+            try:
+                text = self.complete(prefix, document, checklist)
+            finally:
+                self._emit(event, prompt, text, False)
+        if validate is not None:
+            validate(text)
+        if cache is not None and text:
+            cache.put(key, text)
+        return text
+
+    def generate_stream(self, pdf_text, checklist, cache=None, validate=None):
+        """like generate() but yields the response in chunks as they arrive, a cached response is yielded at once.
+        validate is called once the response is complete, before it is cached."""
+        prefix = build_prefix(checklist)
+        document = build_document(pdf_text)
+        prompt = prefix + document
+        if cache is not None:
+            key = cache_key(self.cache_model(), prompt, checklist, self.config)
+            cached = valid_cached(cache.get(key), validate)
+            if cached is not None:
+                with get_telemetry().span("llm", stream=True) as event:
+                    self._emit(event, prompt, cached, True)
+                yield cached
+                return
+
+        chunks = []
+        completed = False
+        start = time.perf_counter()
+        with get_telemetry().span("llm", stream=True) as event:
+            try:
+                for chunk in self.stream(prefix, document, checklist):
+                    if chunk:
+                        if not chunks:
+                            event["first_chunk_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                        chunks.append(chunk)
+                        yield chunk
+                completed = True
+            finally:
+                self._emit(event, prompt, "".join(chunks) if chunks else None, False)
+                event["completed"] = completed
+
+        # only a completely received and validated response is cached
+        if validate is not None:
+            validate("".join(chunks))
+        if cache is not None and chunks:
+            cache.put(key, "".join(chunks))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.model!r})"
+
+
+def valid_cached(cached, validate=None):
+    """the cached response, None if there is none or it fails validation (e.g. stored before responses were validated)"""
+    if cached is None or validate is None:
+        return cached
+    try:
+        validate(cached)
+    except ValueError:
+        return None
+    return cached
+
+
+# Gemini cached contents by (api key, model, prefix) -> (name, monotonic time it expires),
+# the name is None while the prefix can't be cached, the time is then when creating it is tried again
+_context_caches = {}
+_context_caches_lock = threading.Lock()
+# seconds a cached content lives, it is extended when less than CONTEXT_CACHE_REFRESH is left,
+# a failed create is tried again after CONTEXT_CACHE_RETRY
+CONTEXT_CACHE_TTL = 3600
+CONTEXT_CACHE_REFRESH = 600
+CONTEXT_CACHE_RETRY = 300
+
+
+def is_missing_context(error):
+    """error of a request whose cached content expired or was deleted"""
+    return getattr(error, "code", None) in (400, 403, 404) and "cache" in str(error).lower()
+
+
+class GeminiBackend(Backend):
+    """Gemini through the pooled genai client.
+    With context_cache=True the prompt prefix is registered once as cached content and every
+    request only sends the document. Models without context caching (or a prefix below the
+    minimum cache size) fall back to sending the whole prompt."""
+
+    name = "gemini"
+
+    def __init__(self, api_key, model=MODEL, config=None, context_cache=False):
+        super().__init__(model, config or GENERATION_CONFIG)
+        self.api_key = api_key
+        self.context_cache = context_cache
+
+    def _context_key(self, prefix):
+        return self.api_key, self.model, hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+    def cached_context(self, prefix):
+        """Name of the cached content holding the prefix, created on first use and extended before its ttl runs out,
+        so long batches keep using it. None while the prefix can't be cached."""
+        key = self._context_key(prefix)
+        client = get_client(self.api_key)
+        with _context_caches_lock:
+            name, expires = _context_caches.get(key, (None, 0.0))
+            now = time.monotonic()
+            if name is not None and expires - now < CONTEXT_CACHE_REFRESH:
+                try:
+                    client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{CONTEXT_CACHE_TTL}s"))
+                    expires = now + CONTEXT_CACHE_TTL
+                    _context_caches[key] = (name, expires)
+                    get_telemetry().emit("context_cache", model=self.model, ok=True, extended=True)
+                except Exception as e:
+                    # most likely expired already, a new one is created
+                    print(f"could not extend cached content {name} ({e})")
+                    name, expires = None, 0.0
+            if name is None and now >= expires:
+                try:
+                    cached = client.caches.create(
+                        model=self.model,
+                        config=types.CreateCachedContentConfig(
+                            contents=build_contents(prefix),
+                            display_name="reproducibility-checklist",
+                            ttl=f"{CONTEXT_CACHE_TTL}s",
+                        ),
+                    )
+                    name, expires = cached.name, now + CONTEXT_CACHE_TTL
+                except Exception as e:
+                    print(f"context caching not available for {self.model}, sending the full prompt ({e})")
+                    name, expires = None, now + CONTEXT_CACHE_RETRY
+                _context_caches[key] = (name, expires)
+                get_telemetry().emit("context_cache", model=self.model, ok=name is not None)
+            return name
+
+    def drop_context(self, prefix, name):
+        """forget a cached content the API no longer knows, the next request creates a new one"""
+        key = self._context_key(prefix)
+        with _context_caches_lock:
+            if _context_caches.get(key, (None, 0.0))[0] == name:
+                _context_caches[key] = (None, 0.0)
+
+    def _request(self, prefix, document):
+        """contents and config of a request, with a cached context only the document is sent"""
+        cached = self.cached_context(prefix) if self.context_cache else None
+        if cached is None:
+            return build_contents(prefix + document), types.GenerateContentConfig(**self.config)
+        return build_contents(document), types.GenerateContentConfig(cached_content=cached, **self.config)
+
+    def close(self):
+        """delete the cached contents of this key and model"""
+        with _context_caches_lock:
+            for key in [key for key in _context_caches if key[:2] == (self.api_key, self.model)]:
+                name, _ = _context_caches.pop(key)
+                if name is not None:
+                    try:
+                        get_client(self.api_key).caches.delete(name=name)
+                    except Exception as e:
+                        # expires with its ttl anyway
+                        print(f"could not delete cached content {name} ({e})")
+
+    def cache_model(self):
+        # without prefix, so the responses cached before there were several backends stay valid
+        return self.model
+
+    def count_tokens(self, prompt):
+        """exact prompt token count from the API (one extra request)"""
+        with get_telemetry().span("count_tokens", model=self.model) as event:
+            event["input_tokens"] = get_client(self.api_key).models.count_tokens(
+                model=self.model, contents=prompt).total_tokens
+        return event["input_tokens"]
+
+    def complete(self, prefix, document, checklist):
+        for attempt in range(2):
+            contents, config = self._request(prefix, document)
+            try:
+                response = get_client(self.api_key).models.generate_content(
+                    model=self.model,
+                    contents=contents,
+                    config=config
+                )
+                break
+            except Exception as e:
+                if attempt or config.cached_content is None or not is_missing_context(e):
+                    raise
+                # the cached content is gone (e.g. expired), send the request again with a new one
+                self.drop_context(prefix, config.cached_content)
+        self._report_gemini_usage(response)
+        return response.text
+
+    def stream(self, prefix, document, checklist):
+        for attempt in range(2):
+            contents, config = self._request(prefix, document)
+            started = False
+            try:
+                for chunk in get_client(self.api_key).models.generate_content_stream(
+                    model=self.model,
+                    contents=contents,
+                    config=config
+                ):
+                    started = True
+                    # the last chunk carries the usage of the whole response
+                    self._report_gemini_usage(chunk)
+                    if chunk.text:
+                        yield chunk.text
+                return
+            except Exception as e:
+                if attempt or started or config.cached_content is None or not is_missing_context(e):
+                    raise
+                self.drop_context(prefix, config.cached_content)
+
+    def _report_gemini_usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and usage.prompt_token_count is not None:
+            self.report_usage(usage.prompt_token_count, usage.candidates_token_count)
+
+
+class OllamaBackend(Backend):
+    """A local model served by Ollama, needs the ollama package (pip install ollama).
+    The prefix goes first as system message and keep_alive keeps the model loaded between papers,
+    so Ollama can reuse the evaluated prefix instead of processing it again for every paper."""
+
+    name = "ollama"
+
+    def __init__(self, model=OLLAMA_MODEL, host=None, config=None, keep_alive="30m"):
+        super().__init__(model, config or {"temperature": 0})
+        self.keep_alive = keep_alive
+        try:
+            import ollama
+        except ImportError:
+            raise RuntimeError("The Ollama backend needs the ollama package (pip install ollama)")
+        self.client = ollama.Client(host=host)
+
+    def messages(self, prefix, document):
+        return [{"role": "system", "content": prefix}, {"role": "user", "content": document}]
+
+    def complete(self, prefix, document, checklist):
+        response = self.client.chat(
+            model=self.model,
+            messages=self.messages(prefix, document),
+            options=self.config,
+            keep_alive=self.keep_alive
+        )
+        self.report_usage(response.get("prompt_eval_count"), response.get("eval_count"))
+        return response["message"]["content"]
+
+    def stream(self, prefix, document, checklist):
+        for chunk in self.client.chat(
+            model=self.model,
+            messages=self.messages(prefix, document),
+            options=self.config,
+            keep_alive=self.keep_alive,
+            stream=True
+        ):
+            if chunk.get("done"):
+                self.report_usage(chunk.get("prompt_eval_count"), chunk.get("eval_count"))
+            yield chunk["message"]["content"]
+
+
+class StubError(Exception):
+    """simulated API error, code is checked by scheduler.is_retryable like a real one"""
+
+    def __init__(self, code):
+        super().__init__(f"simulated error {code}")
+        self.code = code
+
+
+class StubBackend(Backend):
+    """Offline backend for tests and load tests.
+
+    The answer is valid JSON for the checklist, every status is derived from a hash of prompt and
+    criterion, so the same prompt always gets the same answer. latency (+ up to jitter) seconds are
+    slept per request, error_rate of the requests fail with error_code.
+    """
+
+    name = "stub"
+
+    def __init__(self, model="stub", latency=0.0, jitter=0.0, error_rate=0.0, error_code=503, seed=0,
+                 chunk_size=64):
+        super().__init__(model, {})
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.chunk_size = chunk_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def _delay_and_fail(self):
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def response(self, prompt, checklist):
+        evaluation = []
+        for category in checklist:
+            results = []
+            for criterion in category["criteria"]:
+                digest = hashlib.sha256(f"{prompt}\n{criterion['name']}".encode("utf-8")).digest()
+                results.append({
+                    "criterion": criterion["name"],
+                    "status": "Met" if digest[0] % 2 else "Not Met",
+                    "justification": "stub response",
+                })
+            evaluation.append({"category": category["category"], "results": results})
+        return json.dumps(evaluation, indent=2)
+
+    def complete(self, prefix, document, checklist):
+        delay, fail = self._delay_and_fail()
+        time.sleep(delay)
+        if fail:
+            raise StubError(self.error_code)
+        return self.response(prefix + document, checklist)
+
+    def stream(self, prefix, document, checklist):
+        delay, fail = self._delay_and_fail()
+        text = self.response(prefix + document, checklist)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            # a failing stream breaks off halfway like a dropped connection
+            if fail and i == len(chunks) // 2:
+                raise StubError(self.error_code)
+            yield chunk
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "ollama": OllamaBackend,
+    "stub": StubBackend,
+}
+
+
+def create_backend(name, api_key=None, model=None, **options):
+    """backend by name, options are passed to its constructor (e.g. latency and error_rate for the stub)"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}, expected one of {list(BACKENDS)}")
+    if model:
+        options["model"] = model
+    if name == "gemini":
+        return GeminiBackend(api_key, **options)
+    return BACKENDS[name](**options)
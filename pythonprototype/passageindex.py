@@ -0,0 +1,129 @@
+import re
+import math
+from collections import Counter, defaultdict
+from sectionplanner import IRRELEVANT_TITLES, EVIDENCE, STOPWORDS
+
+# passages are whole sentences up to about this many characters
+PASSAGE_CHARS = 800
+
+DEFAULT_TOP_K = 3
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# added to the score of a passage that matches the query and contains an EVIDENCE phrase
+EVIDENCE_BONUS = 1.0
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"[a-z0-9][a-z0-9\-]+")
+SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "ed", "es", "s")
+
+# words of the checklist descriptions that say nothing about the criterion
+QUERY_STOPWORDS = STOPWORDS | {"the", "and", "are", "for", "is", "or", "any", "has", "was", "were", "e.g"}
+
+
+def stem(word):
+    """crude suffix stripping, enough to match e.g. "datasets"/"dataset" and "reported"/"reporting" """
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD.findall(text.lower()) if len(word) > 2 and word not in QUERY_STOPWORDS]
+
+
+def split_passages(sections, passage_chars=PASSAGE_CHARS):
+    """(title, passage) pairs in document order, sentences are grouped into passages of about passage_chars.
+    References, bibliography and acknowledgements are left out."""
+    passages = []
+    for title, text in sections.items():
+        if IRRELEVANT_TITLES.search(title):
+            continue
+        current = []
+        length = 0
+        for sentence in SENTENCE_END.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if current and length + len(sentence) > passage_chars:
+                passages.append((title, " ".join(current)))
+                current = []
+                length = 0
+            current.append(sentence)
+            length += len(sentence) + 1
+        if current:
+            passages.append((title, " ".join(current)))
+    return passages
+
+
+def criterion_query(criterion):
+    return tokenize(f"{criterion['name']} {criterion['description']}")
+
+
+class PassageIndex:
+    """BM25 inverted index over the passages of one paper"""
+
+    def __init__(self, sections, passage_chars=PASSAGE_CHARS):
+        self.passages = split_passages(sections, passage_chars)
+        self.postings = defaultdict(list)
+        self.lengths = []
+        self.evidence = []
+        for i, (_, text) in enumerate(self.passages):
+            counts = Counter(tokenize(text))
+            for term, frequency in counts.items():
+                self.postings[term].append((i, frequency))
+            self.lengths.append(sum(counts.values()))
+            self.evidence.append(EVIDENCE.search(text) is not None)
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+
+    def __len__(self):
+        return len(self.passages)
+
+    def scores(self, query):
+        """BM25 score of every passage that contains a query term, {passage index: score}"""
+        scores = defaultdict(float)
+        n = len(self.passages)
+        for term in set(query):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, frequency in postings:
+                norm = K1 * (1 - B + B * self.lengths[i] / self.average_length)
+                scores[i] += idf * frequency * (K1 + 1) / (frequency + norm)
+        for i in scores:
+            if self.evidence[i]:
+                scores[i] += EVIDENCE_BONUS
+        return scores
+
+    def search(self, query, k=DEFAULT_TOP_K):
+        """indices of the k best passages for the query"""
+        scores = self.scores(query)
+        return sorted(scores, key=lambda i: (-scores[i], i))[:k]
+
+    def select(self, checklist, k=DEFAULT_TOP_K):
+        """Top k passages for every criterion of the checklist, merged in document order.
+        Returns [(title, text), ...] with the passages of a section joined under one title, like a plan chunk."""
+        selected = set()
+        for category in checklist:
+            for criterion in category["criteria"]:
+                selected.update(self.search(criterion_query(criterion), k))
+
+        chunk = []
+        for i in sorted(selected):
+            title, text = self.passages[i]
+            if chunk and chunk[-1][0] == title:
+                # "[...]" marks the text left out between two passages
+                gap = " " if i - 1 in selected else " [...] "
+                chunk[-1] = (title, chunk[-1][1] + gap + text)
+            else:
+                chunk.append((title, text))
+        return chunk
+
+
+def retrieve_passages(sections, checklist, k=DEFAULT_TOP_K):
+    """the evidence passages of the paper for all criteria of the checklist"""
+    return PassageIndex(sections).select(checklist, k)
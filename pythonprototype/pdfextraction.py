@@ -0,0 +1,169 @@
+import re
+import contextvars
+from bisect import bisect_left
+from pypdf import PdfReader
+from telemetry import get_telemetry
+from textnormalizer import normalize_pages, collapse_whitespace, join_lines, savings
+
+# a bookmark title or a line of page text that starts the references, the pages after it are not extracted
+REFERENCES_TITLE = re.compile(r"^\s*(?:\d+\.?\s*)?(?:references|bibliography)\s*$", re.IGNORECASE)
+REFERENCES_HEADING = re.compile(REFERENCES_TITLE.pattern, re.IGNORECASE | re.MULTILINE)
+
+# normalization savings of the last extraction in this context, the section cache stores them with the sections
+extraction_stats = contextvars.ContextVar("extraction_stats", default=None)
+
+
+def find_title_occurrences(text, titles):
+    """Find every (case insensitive) occurrence of every title in a single pass over the text.
+
+    Returns a dict lowercased title -> list of (start, end), sorted by start.
+    The lookahead pattern reports overlapping occurrences, at each position the longest title wins,
+    shorter titles that are a prefix of it are recorded at the same position.
+    """
+    keys = list(dict.fromkeys(title.lower() for title in titles if title))
+    occurrences = {key: [] for key in keys}
+    if not keys:
+        return occurrences
+
+    keys.sort(key=len, reverse=True)
+    prefixes = {key: [other for other in keys if other != key and key.startswith(other)] for key in keys}
+    pattern = re.compile("(?=(" + "|".join(re.escape(key) for key in keys) + "))", re.IGNORECASE)
+
+    for match in pattern.finditer(text):
+        key = match.group(1).lower()
+        if key not in occurrences:
+            continue
+        start = match.start()
+        occurrences[key].append((start, start + len(match.group(1))))
+        for prefix in prefixes[key]:
+            occurrences[prefix].append((start, start + len(prefix)))
+    return occurrences
+
+
+def first_occurrence(occurrences, starts, title, position=0):
+    """first occurrence of title starting at or after position, None if there is none"""
+    if not title:
+        return position, position
+    key = title.lower()
+    found = occurrences.get(key)
+    if not found:
+        return None
+    i = bisect_left(starts[key], position)
+    return found[i] if i < len(found) else None
+
+
+def split_sections(all_text, bookmarks):
+    """Cut the text into sections at the bookmark titles.
+
+    Each section starts after the first occurrence of its title and ends
+    at the next occurrence of the following bookmark title.
+    """
+    occurrences = find_title_occurrences(all_text, bookmarks)
+    starts = {key: [start for start, _ in found] for key, found in occurrences.items()}
+
+    sections = {}
+    for i, title in enumerate(bookmarks):
+        next_title = bookmarks[i + 1] if i + 1 < len(bookmarks) else None
+
+        # look for current title in text
+        match = first_occurrence(occurrences, starts, title)
+        if match is None:
+            print(f"title not found: {title}")
+            get_telemetry().emit("title_not_found", title=title)
+            continue
+        section_start = match[1]
+
+        # look for next title after the current one and cut off
+        section_end = len(all_text)
+        if next_title is not None:
+            next_match = first_occurrence(occurrences, starts, next_title, section_start)
+            if next_match:
+                section_end = next_match[0]
+
+        # saves each section
+        sections[title] = all_text[section_start:section_end].strip()
+
+    return sections
+
+
+def read_outline(reader: PdfReader):
+    """top level bookmarks as (title, page number), the page is None if the destination can't be resolved"""
+    outline = []
+    for item in reader.outline:
+        if "/Title" in item:
+            try:
+                page = reader.get_destination_page_number(item)
+            except Exception:
+                page = None
+            outline.append((item["/Title"], page))
+    return outline
+
+
+def reference_pages(outline, page_count):
+    """Pages that only hold references according to the outline: from the page after the references
+    bookmark up to the page of the bookmark following it (e.g. an appendix), or to the end of the PDF.
+    The page the references start on is still needed for the end of the section before them."""
+    for i, (title, page) in enumerate(outline):
+        if page is not None and REFERENCES_TITLE.match(title):
+            following = [next_page for _, next_page in outline[i + 1:] if next_page is not None and next_page > page]
+            return range(page + 1, following[0] if following else page_count)
+    return range(0)
+
+
+def iter_page_texts(reader: PdfReader, skip=range(0)):
+    """Yield the text of every page not in skip, a page is only extracted when the consumer asks for it"""
+    for number, page in enumerate(reader.pages):
+        if number in skip:
+            continue
+        yield page.extract_text()
+
+
+def until_references(texts):
+    """pass the page texts on up to the first references heading (not on the first page),
+    the page generator is not advanced after it"""
+    for number, text in enumerate(texts):
+        heading = REFERENCES_HEADING.search(text) if number and text else None
+        if heading:
+            yield text[:heading.start()]
+            return
+        yield text
+
+
+def extract_sections_using_bookmarks(reader: PdfReader, include_references=False):
+    """Splits the PDF into sections using its bookmarks.
+    Unless include_references is set, extraction stops at the references: the pages behind the references
+    bookmark are skipped up to the next bookmark (appendices are kept) and the references section is dropped,
+    without bookmarks the full text ends at the first references heading."""
+    outline = read_outline(reader)
+    bookmarks = [title for title, _ in outline]
+    page_count = len(reader.pages)
+
+    if include_references:
+        texts = list(iter_page_texts(reader))
+    elif bookmarks:
+        texts = list(iter_page_texts(reader, reference_pages(outline, page_count)))
+    else:
+        texts = list(until_references(iter_page_texts(reader)))
+    if len(texts) < page_count:
+        get_telemetry().emit("references_skipped", pages=page_count - len(texts), of=page_count)
+
+    text = normalize_pages(texts)
+    #if pdf has no bookmarks just use full text
+    if not bookmarks:
+        full_text = collapse_whitespace(text)
+        extraction_stats.set(savings("\n".join(text for text in texts if text), full_text))
+        return {"Full Text": full_text}
+
+    # remove all double new lines from text so that headlines will be found and not broken up
+    all_text = join_lines(text)
+    extraction_stats.set(savings("\n".join(texts), all_text))
+    sections = split_sections(all_text, bookmarks)
+    if not include_references:
+        sections = {title: text for title, text in sections.items() if not REFERENCES_TITLE.match(title)}
+    return sections
+
+
+def extract_all_sections(reader: PdfReader):
+    """extract_sections_using_bookmarks including the references, a separate extractor so the section cache
+    keeps both variants apart"""
+    return extract_sections_using_bookmarks(reader, include_references=True)
@@ -0,0 +1,187 @@
+import re
+from evaluationmodel import normalize_name
+from sectionplanner import IRRELEVANT_TITLES
+from pdfextraction import REFERENCES_HEADING
+
+# links to places where code is shared
+CODE_REPOSITORY = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:github\.com|gitlab\.com|bitbucket\.org|codeberg\.org)"
+    r"/\s?[\w.\-]+(?:/[\w.\-]+)?",
+    re.IGNORECASE,
+)
+
+# links to places where data (and often code) is shared
+DATA_REPOSITORY = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:osf\.io|zenodo\.org|figshare\.com|datadryad\.org|dataverse\.[a-z.]+"
+    r"|kaggle\.com/datasets|openneuro\.org|data\.mendeley\.com|researchbox\.org)/\s?[\w.\-/]+"
+    r"|doi\.org/10\.5281/zenodo\.\d+|10\.17605/osf\.io/\w+",
+    re.IGNORECASE,
+)
+
+# statements that something can be obtained somewhere, a sentence with one of them and a topic term
+# keeps the criterion undecided
+AVAILABILITY = re.compile(
+    r"available|availability|access|obtain|can be found|shared|sharing|released|repository|supplementa|appendix"
+    r"|upon request|on request|open[- ]sourced?|anonymi[sz]ed for review|https?://|www\."
+    r"|\b(?:github|gitlab|osf|zenodo|figshare)\b",
+    re.IGNORECASE,
+)
+CODE_TERMS = re.compile(r"\b(?:code|scripts?|software|implementation|notebooks?|source|tools?|packages?|materials)\b"
+                        r"|open[- ]sourced?", re.IGNORECASE)
+DATA_TERMS = re.compile(r"\b(?:data|datasets?|corpus|corpora|logs|materials)\b", re.IGNORECASE)
+
+# a repository link only decides a criterion if the sentence of the link (or the one before) says that the authors
+# share their own artifacts there, "publicly available" alone is also said of third-party tools and datasets
+OWNERSHIP = re.compile(
+    r"\bour\s+(?:[\w-]+\s+){0,3}?(?:code|scripts?|software|implementation|notebooks?|source|tools?|packages?"
+    r"|materials|data|datasets?|corpus|corpora|logs|analys[ie]s|repository|supplementa\w*)\b"
+    r"|\b(?:code|scripts|software|materials|data|datasets?)\s+(?:[\w-]+\s+){0,3}?(?:of|for|from)\s+(?:our|this)\s+"
+    r"(?:study|studies|work|paper|project|analys[ie]s|experiments?)\b"
+    r"|\bwe\s+(?:have\s+|also\s+){0,2}(?:release[ds]?|share[ds]?|provide[ds]?|publish(?:ed)?|open[- ]sourced?"
+    r"|upload(?:ed)?|deposit(?:ed)?|ma[dk]e\s+(?:[\w-]+\s+){1,4}?(?:publicly\s+|openly\s+|freely\s+)?available)\b",
+    re.IGNORECASE,
+)
+
+# any mention of a preregistration, only its absence is decided without the LLM
+PREREGISTRATION = re.compile(r"pre-?\s?regist|aspredicted|registered report|osf\.io/\S*regist", re.IGNORECASE)
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# any web link, a link near a topic term keeps the criterion undecided
+URL = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+
+# punctuation of the sentence that ends up at the end of a matched link
+LINK_TRAILING = ".,;:)]"
+
+# characters around a repository link in which the topic terms are looked for
+CONTEXT_CHARS = 200
+
+
+def screening_text(sections):
+    """the text the pre-screen looks at: all sections except references (links there belong to other papers)"""
+    texts = []
+    for title, text in sections.items():
+        if IRRELEVANT_TITLES.search(title):
+            continue
+        # a paper without bookmarks extracted with include_references, everything after the last heading is left out
+        headings = list(REFERENCES_HEADING.finditer(text))
+        if headings:
+            text = text[:headings[-1].start()]
+        texts.append(text)
+    return "\n\n".join(texts)
+
+
+def link_sentences(text, match):
+    """the sentence of the link and the one before it, each cut to CONTEXT_CHARS"""
+    before = text[max(0, match.start() - 2 * CONTEXT_CHARS):match.start()]
+    ends = [end.end() for end in SENTENCE_END.finditer(before)]
+    if len(ends) >= 2:
+        before = before[ends[-2]:]
+    after = text[match.end():match.end() + CONTEXT_CHARS]
+    end = SENTENCE_END.search(after)
+    return before + match.group(0) + (after[:end.start()] if end else after)
+
+
+def find_link(text, repository, topic):
+    """first repository link next to a topic term and a statement that the authors share their own artifacts there,
+    links to third-party resources are left to the LLM"""
+    for match in repository.finditer(text):
+        context = link_sentences(text, match)
+        if topic.search(context) and OWNERSHIP.search(context):
+            return match.group(0).rstrip(LINK_TRAILING)
+    return None
+
+
+def mentions_link(text, repositories, topic):
+    """is there any link that could point to the topic: a repository link, with or without ownership wording,
+    or another link with a topic term around it"""
+    if any(repository.search(text) for repository in repositories):
+        return True
+    return any(topic.search(text[max(0, match.start() - CONTEXT_CHARS):match.end() + CONTEXT_CHARS])
+               for match in URL.finditer(text))
+
+
+def mentions_availability(text, topic):
+    """is there a sentence that talks about the availability of the topic at all"""
+    return any(topic.search(sentence) and AVAILABILITY.search(sentence) for sentence in SENTENCE_END.split(text))
+
+
+def screen_code(text):
+    link = find_link(text, CODE_REPOSITORY, CODE_TERMS)
+    if link:
+        return "Met", f"Pre-screen: code repository link found ({link})."
+    # a link without ownership wording is left to the LLM, it may still be the authors' code
+    if not mentions_link(text, (CODE_REPOSITORY, DATA_REPOSITORY), CODE_TERMS) \
+            and not mentions_availability(text, CODE_TERMS):
+        return "Not Met", "Pre-screen: no code repository link and no statement about code availability found."
+    return None
+
+
+def screen_data(text):
+    # code hosting links are left to the LLM for data, they often hold only code or third-party datasets
+    link = find_link(text, DATA_REPOSITORY, DATA_TERMS)
+    if link:
+        return "Met", f"Pre-screen: data repository link found ({link})."
+    if not mentions_link(text, (DATA_REPOSITORY, CODE_REPOSITORY), DATA_TERMS) \
+            and not mentions_availability(text, DATA_TERMS):
+        return "Not Met", "Pre-screen: no data repository link and no statement about data availability found."
+    return None
+
+
+def screen_preregistration(text):
+    if not PREREGISTRATION.search(text):
+        return "Not Met", "Pre-screen: the paper does not mention a preregistration."
+    return None
+
+
+# criteria the pre-screen can decide, by name, each screen returns (status, justification) or None if undecided
+SCREENS = {
+    normalize_name("Open Source Code 1"): screen_code,
+    normalize_name("Open Data 1"): screen_data,
+    normalize_name("Preregistration"): screen_preregistration,
+}
+
+
+def prescreen(sections, checklist):
+    """Decide the criteria that have cheap, reliable signals before the LLM call.
+
+    Returns (decided, remaining): decided maps (category, criterion) to the result dict,
+    remaining is the checklist without the decided criteria (categories without criteria left are dropped).
+    """
+    text = screening_text(sections)
+    decided = {}
+    remaining = []
+    for category in checklist:
+        criteria = []
+        for criterion in category["criteria"]:
+            screen = SCREENS.get(normalize_name(criterion["name"]))
+            outcome = screen(text) if screen else None
+            if outcome is None:
+                criteria.append(criterion)
+            else:
+                decided[(category["category"], criterion["name"])] = {
+                    "criterion": criterion["name"],
+                    "status": outcome[0],
+                    "justification": outcome[1],
+                }
+        if criteria:
+            remaining.append({**category, "criteria": criteria})
+    return decided, remaining
+
+
+def merge_prescreen(evaluation, decided, checklist):
+    """put the decided results back into the LLM evaluation, categories and criteria in checklist order"""
+    by_category = {category["category"]: {result["criterion"]: result for result in category["results"]}
+                   for category in evaluation}
+    merged = []
+    for category in checklist:
+        results = by_category.get(category["category"], {})
+        ordered = []
+        for criterion in category["criteria"]:
+            result = decided.get((category["category"], criterion["name"])) or results.pop(criterion["name"], None)
+            if result is not None:
+                ordered.append(result)
+        # anything extra the LLM returned is kept after the checklist criteria
+        ordered.extend(result for name, result in results.items() if name not in {r["criterion"] for r in ordered})
+        merged.append({"category": category["category"], "results": ordered})
+    return merged
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = "llmcache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def cache_key(model, prompt, checklist, config):
+    """sha256 over model name, rendered prompt, checklist and generation config"""
+    payload = json.dumps({
+        "model": model,
+        "prompt": prompt,
+        "checklist": checklist,
+        "config": config,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Persistent LLM response cache, one file per response, evicts least recently used entries above max_bytes.
+
+    Recency is kept in the file mtime, so the LRU order survives restarts.
+    With bypass=True the cache is not read but fresh responses are still stored.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, bypass=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for filename in os.listdir(directory):
+            if filename.endswith(".txt"):
+                stat = os.stat(os.path.join(directory, filename))
+                entries.append((stat.st_mtime, filename[:-4], stat.st_size))
+        entries.sort()
+        # key -> size, oldest first
+        self.index = OrderedDict((key, size) for _, key, size in entries)
+        self.total_bytes = sum(self.index.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key):
+        with self.lock:
+            if self.bypass or key not in self.index:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    text = f.read()
+            except FileNotFoundError:
+                self.total_bytes -= self.index.pop(key)
+                self.misses += 1
+                return None
+            os.utime(self._path(key))
+            self.index.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        data = text.encode("utf-8")
+        with self.lock:
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+
+            self.total_bytes -= self.index.pop(key, 0)
+            self.index[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.index) > 1:
+            key, size = self.index.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.index),
+                "bytes": self.total_bytes,
+            }
@@ -0,0 +1,263 @@
+import re
+import json
+import json5
+from telemetry import get_telemetry
+
+CATEGORY_NAME = re.compile(r'"category"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+SMART_QUOTES = "\u201c\u201d\u201e\u201f"
+CLOSING = {"[": "]", "{": "}"}
+
+# the statuses the prompt asks for, keyed by their normalized spelling
+STATUSES = {"met": "Met", "not met": "Not Met"}
+
+
+def scan_array(text, start):
+    """Read the array (or object) starting at text[start] in one pass and repair it on the way.
+
+    Smart quotes used as string delimiters become straight quotes, trailing commas are dropped and a
+    truncated tail is cut back to the last complete value with the open brackets closed.
+    Returns (json text, end index, repaired flag).
+    """
+    out = []
+    stack = []
+    in_string = False
+    string_quote = None
+    escape = False
+    repaired = False
+    last_complete = None
+
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"' or (string_quote != '"' and char in SMART_QUOTES):
+                in_string = False
+                if char != '"':
+                    char = '"'
+                    repaired = True
+            elif char == "\n":
+                char = "\\n"
+                repaired = True
+            out.append(char)
+            continue
+
+        if char == '"' or char in SMART_QUOTES:
+            in_string = True
+            string_quote = char
+            if char != '"':
+                char = '"'
+                repaired = True
+        elif char in CLOSING:
+            stack.append(CLOSING[char])
+        elif char in "]}":
+            # drop a trailing comma before the closing bracket
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+                repaired = True
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                return "".join(out), i + 1, repaired
+            last_complete = (len(out), list(stack))
+            continue
+        out.append(char)
+
+    # truncated output: keep everything up to the last complete value and close the open brackets
+    if last_complete is None:
+        return "".join(out) + "".join(reversed(stack)), len(text), True
+    length, stack = last_complete
+    out = out[:length]
+    while out and (out[-1].isspace() or out[-1] == ","):
+        out.pop()
+    return "".join(out) + "".join(reversed(stack)), len(text), True
+
+
+def extract_json_from_response(text):
+    """JSON text of the first top-level array in the LLM output (code fences and commentary around it are ignored)"""
+    start = text.find("[")
+    if start < 0:
+        raise ValueError("No JSON array found in the LLM output.")
+    return scan_array(text, start)[0]
+
+
+def normalize_status(status):
+    key = " ".join(str(status).replace("_", " ").split()).lower()
+    return STATUSES.get(key, status)
+
+
+def validate_evaluation(evaluation, checklist=None):
+    """Check the shape of a parsed evaluation and normalize the statuses.
+    With a checklist every category and criterion of it has to be present."""
+    if isinstance(evaluation, dict):
+        evaluation = evaluation.get("evaluation", [evaluation])
+    if not isinstance(evaluation, list):
+        raise ValueError("Evaluation is not a list of categories.")
+    for category in evaluation:
+        if not isinstance(category, dict) or "category" not in category or not isinstance(category.get("results"), list):
+            raise ValueError(f"Malformed category: {str(category)[:200]}")
+        for result in category["results"]:
+            if not isinstance(result, dict) or "criterion" not in result or "status" not in result:
+                raise ValueError(f"Malformed result in {category['category']}: {str(result)[:200]}")
+            result["status"] = normalize_status(result["status"])
+
+    if checklist:
+        found = {category["category"]: {result["criterion"] for result in category["results"]} for category in evaluation}
+        missing = [
+            f"{category['category']}: {criterion['name']}"
+            for category in checklist
+            for criterion in category["criteria"]
+            if criterion["name"] not in found.get(category["category"], ())
+        ]
+        if missing:
+            raise ValueError(f"Evaluation is missing criteria: {', '.join(missing)}")
+    return evaluation
+
+
+def load_candidate(candidate, errors):
+    """parse a repaired JSON text with json, json5 as fallback.
+    Returns (value, the loads function that parsed it) or (None, None), the parse errors are appended to errors."""
+    for loads in (json.loads, json5.loads):
+        try:
+            return loads(candidate), loads
+        except ValueError as e:
+            errors.append(str(e))
+    return None, None
+
+
+def parse_evaluation(text, checklist=None):
+    """Parse the LLM output into the evaluation list.
+
+    Every top-level array candidate is scanned once and repaired on the way (see scan_array),
+    it is then parsed with json, json5 as fallback, and validated against the checklist.
+    """
+    with get_telemetry().span("parse", characters=len(text)) as event:
+        errors = []
+        start = text.find("[")
+        candidates = 0
+        while start >= 0:
+            candidate, end, repaired = scan_array(text, start)
+            candidates += 1
+            parsed, loads = load_candidate(candidate, errors)
+            if loads is not None:
+                try:
+                    evaluation = validate_evaluation(parsed, checklist)
+                    event.update(repaired=repaired, json5=loads is json5.loads, candidates=candidates)
+                    return evaluation
+                except ValueError as e:
+                    errors.append(str(e))
+                # the arrays inside a parsed candidate are part of it, continue after it
+                start = text.find("[", end)
+            else:
+                # e.g. a bracket in commentary before the JSON, try the next one
+                start = text.find("[", start + 1)
+        event["candidates"] = candidates
+        raise ValueError(f"No valid evaluation found in the LLM output. {errors[0] if errors else ''}".strip())
+
+
+class IncrementalJSONParser:
+    """Parses a streamed LLM response while it arrives, for showing the results progressively.
+
+    feed() takes the next chunk of text and returns the objects that were completed by it:
+    ("criterion", category name, criterion dict) for every closed result object and
+    ("category", category dict) for every closed category object.
+    The top-level array starts at the first "[" followed by "{", text before it (e.g. ```json or a bracket
+    in commentary) is skipped. Closed objects are repaired like in parse_evaluation, an object that still
+    does not parse is skipped, the complete response is parsed with parse_evaluation in any case.
+    """
+
+    def __init__(self):
+        self.started = False
+        # a "[" was seen before the array started, the next non-space character decides if the array starts
+        self.bracket = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.string_quote = None
+        self.escape = False
+        self.category_buffer = None
+        self.criterion_buffer = None
+        self.categories = []
+        self.skipped = 0
+
+    def feed(self, chunk):
+        events = []
+        for char in chunk:
+            if self.done:
+                break
+            if not self.started:
+                if self.bracket and char == "{":
+                    self.started = True
+                    self.depth = 1
+                elif char == "[":
+                    self.bracket = True
+                    continue
+                elif not char.isspace():
+                    self.bracket = False
+                    continue
+                else:
+                    continue
+
+            if char == "{" and not self.in_string:
+                if self.depth == 1:
+                    self.category_buffer = []
+                elif self.depth == 3:
+                    self.criterion_buffer = []
+            if self.category_buffer is not None:
+                self.category_buffer.append(char)
+            if self.criterion_buffer is not None:
+                self.criterion_buffer.append(char)
+
+            # strings are delimited like in scan_array, smart quotes included
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"' or (self.string_quote != '"' and char in SMART_QUOTES):
+                    self.in_string = False
+            elif char == '"' or char in SMART_QUOTES:
+                self.in_string = True
+                self.string_quote = char
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if char == "}" and self.depth == 3 and self.criterion_buffer is not None:
+                    criterion = self._parse(self.criterion_buffer)
+                    if criterion is not None:
+                        events.append(("criterion", self._category_name(), criterion))
+                    self.criterion_buffer = None
+                elif char == "}" and self.depth == 1 and self.category_buffer is not None:
+                    category = self._parse(self.category_buffer)
+                    if category is not None:
+                        self.categories.append(category)
+                        events.append(("category", category))
+                    self.category_buffer = None
+                elif self.depth == 0:
+                    self.done = True
+        return events
+
+    def _category_name(self):
+        # the open category object, closed and repaired so a smart quoted name is found as well
+        match = CATEGORY_NAME.search(scan_array("".join(self.category_buffer), 0)[0])
+        return match.group(1) if match else None
+
+    def _parse(self, buffer):
+        """the closed object repaired like in parse_evaluation, None if it still does not parse"""
+        parsed, loads = load_candidate(scan_array("".join(buffer), 0)[0], [])
+        if loads is None or not isinstance(parsed, dict):
+            self.skipped += 1
+            return None
+        return parsed
+
+    def result(self):
+        """the parsed top-level array, None while it is not closed yet"""
+        return self.categories if self.done else None
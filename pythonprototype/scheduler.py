@@ -0,0 +1,160 @@
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from telemetry import get_telemetry
+
+# HTTP status codes that are worth retrying (rate limit and server errors)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    """check the status code of an API error (genai uses .code, httpx/requests use .status_code)"""
+    for attribute in ("code", "status_code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status in RETRYABLE_STATUS
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt, base_delay=2.0, max_delay=60.0):
+    """exponential backoff with full jitter"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RateLimiter:
+    """Sliding one minute window over requests and tokens, acquire() blocks until both budgets allow the request"""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, clock=time.monotonic, sleep=time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self.window = deque()
+        self.window_tokens = 0
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.window and now - self.window[0][0] >= 60:
+            _, tokens = self.window.popleft()
+            self.window_tokens -= tokens
+
+    def _wait_time(self, now, tokens):
+        """seconds until the request fits, 0 if it fits now"""
+        if not self.window:
+            # an empty window always admits, even a request larger than the token budget
+            return 0
+        wait = 0
+        if self.requests_per_minute and len(self.window) >= self.requests_per_minute:
+            wait = self.window[len(self.window) - self.requests_per_minute][0] + 60 - now
+        if self.tokens_per_minute and self.window_tokens + tokens > self.tokens_per_minute:
+            # wait until enough old requests have left the window
+            freed = 0
+            for timestamp, used in self.window:
+                freed += used
+                if self.window_tokens - freed + tokens <= self.tokens_per_minute:
+                    wait = max(wait, timestamp + 60 - now)
+                    break
+            else:
+                wait = max(wait, self.window[-1][0] + 60 - now)
+        return max(wait, 0)
+
+    def acquire(self, tokens=0):
+        """block until the request fits into the budgets, returns the time spent waiting"""
+        waited = 0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._expire(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self.window.append((now, tokens))
+                    self.window_tokens += tokens
+                    return waited
+            self.sleep(wait)
+            waited += wait
+
+
+class EvaluationScheduler:
+    """Keeps up to max_workers evaluations in flight.
+
+    Jobs are submitted with submit(), inside a job the LLM request is made with call(),
+    which waits for the rate limiter and retries 429/5xx errors with jittered exponential backoff.
+    """
+
+    def __init__(self, max_workers=4, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=5, base_delay=2.0, max_delay=60.0, limiter=None, sleep=time.sleep):
+        self.max_workers = max_workers
+        self.limiter = limiter or RateLimiter(requests_per_minute, tokens_per_minute, sleep=sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.finished = 0
+        self.retries = 0
+        self.rate_limited_seconds = 0
+
+    def _run(self, func, args, kwargs):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.finished += 1
+
+    def submit(self, func, *args, **kwargs):
+        with self.lock:
+            self.queued += 1
+        return self.executor.submit(self._run, func, args, kwargs)
+
+    def call(self, func, *args, tokens=0, **kwargs):
+        """make a rate limited request, retrying retryable errors"""
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire(tokens)
+            with self.lock:
+                self.rate_limited_seconds += waited
+            if waited:
+                get_telemetry().emit("rate_limited", duration_ms=round(waited * 1000, 2), tokens=tokens)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                with self.lock:
+                    self.retries += 1
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                get_telemetry().emit("retry", attempt=attempt + 1, delay_s=round(delay, 2),
+                                     error=f"{type(e).__name__}: {e}")
+                self.sleep(delay)
+                attempt += 1
+
+    def queue_depth(self):
+        with self.lock:
+            return {
+                "queued": self.queued,
+                "running": self.running,
+                "finished": self.finished,
+                "retries": self.retries,
+                "rate_limited_seconds": round(self.rate_limited_seconds, 1),
+            }
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        # on an error or Ctrl-C the queued jobs are dropped, only the running ones are finished
+        self.shutdown(cancel_pending=exc_type is not None)
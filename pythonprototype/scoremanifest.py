@@ -0,0 +1,128 @@
+import os
+import json
+import sqlite3
+import hashlib
+from evaluationmodel import default_checklist
+from corpusscorer import ScoreTable, status_mask
+from scoringrules import rubric_version
+
+DEFAULT_MANIFEST_PATH = "scoremanifest.sqlite"
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def checklist_version(checklist):
+    """hash over the category and criterion names, the bit positions of the stored masks depend on them"""
+    names = [(category.name, [criterion.name for criterion in category.criteria]) for category in checklist.categories]
+    return hashlib.sha256(json.dumps(names).encode("utf-8")).hexdigest()[:16]
+
+
+class ScoreManifest:
+    """SQLite manifest of the scored evaluation files.
+
+    For every file it keeps mtime, size and content hash together with the criterion bitmasks of
+    its EvaluationRecord, so a rescore only parses the files that are new or changed.
+    Masks are stored as text because they can be wider than 64 bit.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH, checklist=None):
+        self.path = path
+        self.checklist = checklist or default_checklist()
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                id TEXT,
+                met TEXT NOT NULL,
+                present TEXT NOT NULL,
+                exact_met TEXT NOT NULL
+            );
+        """)
+        version = checklist_version(self.checklist)
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'checklist'").fetchone()
+        if row is None or row[0] != version:
+            # another checklist means other bit positions, every file has to be parsed again
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('checklist', ?)", (version,))
+        self.connection.commit()
+        self.skipped = []
+
+    def update(self, directories):
+        """Bring the manifest up to date with the *.json files of the directories.
+        Returns (ids of new or changed evaluations, ids of evaluations whose file is gone).
+        A file that is no valid evaluation is reported and kept out of the manifest (see skipped),
+        so it is parsed again on the next run."""
+        if isinstance(directories, str):
+            directories = [directories]
+        known = {row[0]: row[1:] for row in self.connection.execute("SELECT path, mtime_ns, size, sha256, id FROM files")}
+
+        changed = []
+        seen = set()
+        self.skipped = []
+        for directory in directories:
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(".json"):
+                    continue
+                filepath = os.path.join(directory, filename)
+                seen.add(filepath)
+                stat = os.stat(filepath)
+                entry = known.get(filepath)
+                if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                digest = file_hash(filepath)
+                if entry and entry[2] == digest:
+                    # touched but not changed
+                    self.connection.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, filepath))
+                    continue
+
+                try:
+                    record = self.checklist.load(filepath)
+                except ValueError as e:
+                    print(f"{filepath}: skipped ({e})")
+                    self.skipped.append((filepath, str(e)))
+                    # the scores of its previous version are dropped with the file
+                    seen.discard(filepath)
+                    continue
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (filepath, stat.st_mtime_ns, stat.st_size, digest, record.id,
+                     str(record.met), str(record.present), str(status_mask(record))),
+                )
+                changed.append(record.id)
+
+        removed = []
+        for filepath in sorted(set(known) - seen):
+            self.connection.execute("DELETE FROM files WHERE path = ?", (filepath,))
+            removed.append(known[filepath][3])
+        self.connection.commit()
+        return changed, removed
+
+    def rubrics_changed(self, rubrics):
+        """Record the version of the rubrics the results are written with.
+        True if it differs from the previous run, then the scores of unchanged papers are stale as well."""
+        version = rubric_version(rubrics)
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'rubrics'").fetchone()
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('rubrics', ?)", (version,))
+        self.connection.commit()
+        return row is None or row[0] != version
+
+    def table(self, rubrics=None):
+        """ScoreTable of all files in the manifest, no evaluation file is read, with the files update() skipped"""
+        ids, sources, met, present, exact_met = [], [], [], [], []
+        for row in self.connection.execute("SELECT path, id, met, present, exact_met FROM files ORDER BY path"):
+            sources.append(row[0])
+            ids.append(row[1])
+            met.append(int(row[2]))
+            present.append(int(row[3]))
+            exact_met.append(int(row[4]))
+        return ScoreTable(self.checklist, ids, sources, met, present, exact_met, rubrics, self.skipped)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+from evaluationmodel import default_checklist, normalize_name
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoringrules.json")
+
+# "any": one of the criteria has to be met, "all": every criterion has to be met,
+# "required": every listed criterion has to be met, the others of the category do not matter
+RULE_KINDS = ("any", "all", "required")
+
+
+class CompiledRule:
+    __slots__ = ("category", "kind", "mask", "weight")
+
+    def __init__(self, category, kind, mask, weight):
+        self.category = category
+        self.kind = kind
+        self.mask = mask
+        self.weight = weight
+
+    def apply(self, met):
+        """works on a single met bitmask as well as on a numpy array of bitmasks (one per paper)"""
+        if self.kind == "any":
+            return (met & self.mask) != 0
+        return (met & self.mask) == self.mask
+
+    def __repr__(self):
+        return f"CompiledRule({self.category!r}, {self.kind}, mask={self.mask:#x}, weight={self.weight})"
+
+
+class Rubric:
+    """Scoring rules of one rubric variant compiled against a checklist.
+
+    Every category rule is reduced to a bitmask test on the met mask of an EvaluationRecord,
+    so the rubric can be applied to one paper or to the met column of a whole ScoreTable.
+    """
+
+    def __init__(self, name, rules, reproducible_score):
+        self.name = name
+        self.rules = rules
+        self.reproducible_score = reproducible_score
+
+    @property
+    def max_score(self):
+        return sum(rule.weight for rule in self.rules)
+
+    def verdicts(self, met):
+        return {rule.category: rule.apply(met) for rule in self.rules}
+
+    def score(self, verdicts):
+        # weight 0 rules (counts_toward_score false) are reported but do not change the score
+        return sum(verdicts[rule.category] * rule.weight for rule in self.rules)
+
+    def is_reproducible(self, score):
+        return score >= self.reproducible_score
+
+    def __repr__(self):
+        return f"Rubric({self.name!r}, {len(self.rules)} rules, reproducible at {self.reproducible_score})"
+
+
+def compile_rubric(name, spec, checklist=None):
+    """Turn the rules of one rubric in scoringrules.json into a Rubric.
+    Categories without a rule need all their criteria, unknown names raise ValueError."""
+    checklist = checklist or default_checklist()
+    category_specs = {normalize_name(key): value for key, value in spec.get("categories", {}).items()}
+
+    rules = []
+    for category in checklist.categories:
+        category_spec = category_specs.pop(normalize_name(category.name), {})
+        kind = category_spec.get("rule", "all")
+        if kind not in RULE_KINDS:
+            raise ValueError(f"{name}: unknown rule {kind!r} for {category.name!r}, expected one of {RULE_KINDS}")
+
+        criteria = category_spec.get("criteria")
+        if criteria is None:
+            if kind == "required":
+                raise ValueError(f"{name}: rule 'required' for {category.name!r} needs a list of criteria")
+            mask = category.mask
+        else:
+            mask = 0
+            for criterion_name in criteria:
+                try:
+                    mask |= category.criterion(criterion_name).bit
+                except KeyError as e:
+                    raise ValueError(f"{name}: {e.args[0]}")
+
+        weight = category_spec.get("weight", 1) if category_spec.get("counts_toward_score", True) else 0
+        rules.append(CompiledRule(category.name, "any" if kind == "any" else "all", mask, weight))
+
+    if category_specs:
+        raise ValueError(f"{name}: rules for unknown categories {sorted(category_specs)}")
+
+    max_score = sum(rule.weight for rule in rules)
+    return Rubric(name, rules, spec.get("reproducible_score", max_score))
+
+
+def load_rubrics(path=DEFAULT_RULES_PATH, checklist=None):
+    """all rubric variants of the rules file, compiled, by name in file order"""
+    with open(path, "r", encoding="utf-8") as f:
+        specs = json.load(f)
+    return {name: compile_rubric(name, spec, checklist) for name, spec in specs.items()}
+
+
+_default_rubric = None
+
+
+def default_rubric():
+    """the "default" rubric of scoringrules.json next to this module, compiled once"""
+    global _default_rubric
+    if _default_rubric is None:
+        _default_rubric = load_rubrics()["default"]
+    return _default_rubric
+
+
+def rubric_version(rubrics):
+    """hash over the compiled rules of the rubrics, changes whenever a weight, rule or threshold changes"""
+    if isinstance(rubrics, dict):
+        rubrics = list(rubrics.values())
+    compiled = [(rubric.name, rubric.reproducible_score,
+                 [(rule.category, rule.kind, str(rule.mask), rule.weight) for rule in rubric.rules])
+                for rubric in rubrics]
+    return hashlib.sha256(json.dumps(compiled).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,162 @@
+import os
+import json
+import sqlite3
+import hashlib
+import inspect
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+import textnormalizer
+from pdfextraction import extract_sections_using_bookmarks, extraction_stats
+from telemetry import get_telemetry
+
+DEFAULT_INDEX_PATH = "sectioncache.sqlite"
+
+# modules the extractors depend on, a change in them invalidates the cached sections too
+EXTRACTOR_DEPENDENCIES = [textnormalizer]
+
+_versions = {}
+
+
+def extractor_version(extractor):
+    """hash over the source of the module that defines the extractor and of EXTRACTOR_DEPENDENCIES,
+    so cached sections are invalidated whenever the extraction code changes"""
+    if extractor not in _versions:
+        module = inspect.getmodule(extractor)
+        source = inspect.getsource(module) if module else inspect.getsource(extractor)
+        source += "".join(inspect.getsource(dependency) for dependency in EXTRACTOR_DEPENDENCIES)
+        _versions[extractor] = hashlib.sha256(f"{extractor.__qualname__}\n{source}".encode("utf-8")).hexdigest()[:16]
+    return _versions[extractor]
+
+
+def extractor_name(extractor):
+    return f"{extractor.__module__}.{extractor.__qualname__}"
+
+
+def _extract(extractor, reader):
+    """sections and normalization stats (None if the extractor reports none) of one extraction"""
+    extraction_stats.set(None)
+    sections = extractor(reader)
+    return sections, extraction_stats.get()
+
+
+def _extract_file(pdf_path, extractor):
+    """worker: extract the sections of one PDF in this process"""
+    return _extract(extractor, PdfReader(pdf_path))
+
+
+class SectionCache:
+    """SQLite index of extracted sections, keyed by PDF path and extractor.
+    An entry is only used if file mtime, file size and extractor version still match."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS sections (
+                path TEXT NOT NULL,
+                extractor TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                sections TEXT NOT NULL,
+                stats TEXT,
+                PRIMARY KEY (path, extractor)
+            )
+        """)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(sections)")]
+        if "stats" not in columns:
+            self.connection.execute("ALTER TABLE sections ADD COLUMN stats TEXT")
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, pdf_path, extractor=extract_sections_using_bookmarks):
+        """return the cached sections or None if there is no valid entry"""
+        entry = self.lookup_entry(pdf_path, extractor)
+        return entry[0] if entry else None
+
+    def lookup_entry(self, pdf_path, extractor=extract_sections_using_bookmarks):
+        """(sections, normalization stats) of a valid entry, None if there is none"""
+        path = os.path.abspath(pdf_path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT mtime_ns, size, version, sections, stats FROM sections WHERE path = ? AND extractor = ?",
+                (path, extractor_name(extractor)),
+            ).fetchone()
+        if row and row[:3] == (stat.st_mtime_ns, stat.st_size, extractor_version(extractor)):
+            return json.loads(row[3]), json.loads(row[4]) if row[4] else None
+        return None
+
+    def store(self, pdf_path, sections, extractor=extract_sections_using_bookmarks, stats=None):
+        path = os.path.abspath(pdf_path)
+        stat = os.stat(path)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, extractor_name(extractor), stat.st_mtime_ns, stat.st_size,
+                 extractor_version(extractor), json.dumps(sections), json.dumps(stats) if stats else None),
+            )
+            self.connection.commit()
+
+    def load_sections(self, pdf_path, extractor=extract_sections_using_bookmarks):
+        """cached sections of the PDF, extracts and stores them on a miss (see preload for extracting in parallel).
+        The normalization savings stored with the sections are reported for every load, cached or not."""
+        telemetry = get_telemetry()
+        with telemetry.span("extract", file=os.path.basename(pdf_path)) as event:
+            entry = self.lookup_entry(pdf_path, extractor)
+            event["cached"] = entry is not None
+            with self.lock:
+                if entry is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if entry is None:
+                sections, stats = _extract(extractor, PdfReader(pdf_path))
+                self.store(pdf_path, sections, extractor, stats)
+            else:
+                sections, stats = entry
+            event["sections"] = len(sections)
+            event["characters"] = sum(len(text) for text in sections.values())
+        if stats:
+            telemetry.emit("normalize", **stats)
+        return sections
+
+    def preload(self, pdf_paths, extractor=extract_sections_using_bookmarks, workers=None):
+        """extract all PDFs missing in the index in a process pool, one whole PDF per task"""
+        missing = [pdf_path for pdf_path in pdf_paths if self.lookup(pdf_path, extractor) is None]
+        if not missing:
+            return 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_extract_file, pdf_path, extractor): pdf_path for pdf_path in missing}
+            for future, pdf_path in futures.items():
+                try:
+                    sections, stats = future.result()
+                    self.store(pdf_path, sections, extractor, stats)
+                except Exception as e:
+                    # left out of the index, load_sections reports the error for this paper
+                    print(f"{os.path.basename(pdf_path)}: extraction failed ({e})")
+        return len(missing)
+
+    def close(self):
+        self.connection.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """the shared index in DEFAULT_INDEX_PATH"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SectionCache()
+    return _default_cache
+
+
+def load_sections(pdf_path, extractor=extract_sections_using_bookmarks):
+    """load sections through the shared index"""
+    return get_default_cache().load_sections(pdf_path, extractor)
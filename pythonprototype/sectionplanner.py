@@ -0,0 +1,243 @@
+import re
+from collections import Counter
+
+# default token budget for the document part of the prompt, see altchecker "Choose sections to not exceed Token Count"
+DEFAULT_TOKEN_BUDGET = 15000
+
+# sections that never help with the checklist
+IRRELEVANT_TITLES = re.compile(r"references|bibliography|acknowledg", re.IGNORECASE)
+
+# weight of section title keywords, the highest matching weight counts
+TITLE_WEIGHTS = [
+    (re.compile(r"method|data|result|limitation|availab|code|software|reproduc|preregist", re.IGNORECASE), 3),
+    (re.compile(r"discussion|evaluation|experiment|study|design|analys|procedure|participant|setup|implementation",
+                re.IGNORECASE), 2),
+    (re.compile(r"conclusion|abstract|approach", re.IGNORECASE), 1),
+]
+
+# phrases that are direct evidence for checklist criteria
+EVIDENCE = re.compile(
+    r"github|gitlab|osf\.io|zenodo|figshare|available at|upon request|publicly available|preregist"
+    r"|codebook|p\s*[<=]\s*0?\.\d|effect size|confidence interval|limitation",
+    re.IGNORECASE,
+)
+
+STOPWORDS = {
+    "that", "there", "this", "with", "where", "which", "been", "have", "from", "into", "when", "clear",
+    "clearly", "shared", "given", "described", "mentioned", "somewhere", "else", "cannot", "fully",
+    "does", "contain", "paper", "found", "steps", "potential", "reported", "context",
+}
+
+MIN_RELEVANCE = 2.0
+
+# category words are matched by their first letters, so "preregistered" and "Method" match "preregistration" and "methods"
+STEM_LENGTH = 6
+
+# characters around an evidence phrase in which the category terms are looked for
+EVIDENCE_CONTEXT = 100
+# added to the relevance for a category if an evidence phrase is next to its terms, so the section is always sent
+EVIDENCE_WEIGHT = MIN_RELEVANCE
+
+
+def estimate_tokens(text):
+    """rough local token estimate with about 4 characters per token"""
+    return len(text) // 4 + 1
+
+
+def category_terms(checklist):
+    """Stems of the words in the category name, criterion names and descriptions for every category.
+
+    Returns {category: (pattern, weights)}, a stem used by n categories has the weight 1/n
+    so the stems that tell the categories apart count most.
+    """
+    stems = {}
+    for category in checklist:
+        text = " ".join([category["category"]] + [f"{c['name']} {c['description']}" for c in category["criteria"]])
+        found = {w[:STEM_LENGTH] for w in re.findall(r"[a-z][a-z\-]{3,}", text.lower()) if w not in STOPWORDS}
+        if found:
+            stems[category["category"]] = found
+    shared = Counter(stem for found in stems.values() for stem in found)
+    return {category: (alternation(found), {stem: 1 / shared[stem] for stem in found})
+            for category, found in stems.items()}
+
+
+def alternation(words):
+    return re.compile(r"\b(?:" + "|".join(sorted(map(re.escape, words), key=len, reverse=True)) + r")", re.IGNORECASE)
+
+
+def title_weight(title):
+    return max((weight for pattern, weight in TITLE_WEIGHTS if pattern.search(title)), default=0)
+
+
+def score_sections(sections, checklist):
+    """Relevance of every section per checklist category.
+
+    Returns {title: {category: score}}, the score of a category is the sum of
+    - the title weight if the title matches the category (a "Results" section is not relevant for the code),
+    - the density of the weighted category terms relative to their density in the whole paper (1 is average),
+    - EVIDENCE_WEIGHT if an evidence phrase (e.g. a repository link) is next to category terms.
+    """
+    terms = category_terms(checklist)
+    hits = {}
+    for title, text in sections.items():
+        if IRRELEVANT_TITLES.search(title):
+            continue
+        hits[title] = {category: sum(weights[stem.lower()] for stem in pattern.findall(text))
+                       for category, (pattern, weights) in terms.items()}
+    length = sum(max(len(sections[title]), 1) for title in hits) or 1
+    paper_density = {category: sum(by_category[category] for by_category in hits.values()) / length
+                     for category in terms}
+
+    scores = {}
+    for title, by_category in hits.items():
+        text = sections[title]
+        evidence = set()
+        for match in EVIDENCE.finditer(text):
+            context = text[max(0, match.start() - EVIDENCE_CONTEXT):match.end() + EVIDENCE_CONTEXT]
+            evidence.update(category for category, (pattern, weights) in terms.items()
+                            if sum(weights[stem.lower()] for stem in pattern.findall(context)) >= 1)
+        weight = title_weight(title)
+        scores[title] = {
+            category: (weight if pattern.search(title) else 0)
+            + (by_category[category] / max(len(text), 1) / paper_density[category] if paper_density[category] else 0)
+            + (EVIDENCE_WEIGHT if category in evidence else 0)
+            for category, (pattern, _) in terms.items()
+        }
+    return scores
+
+
+def split_text(text, max_tokens):
+    """split a text that is too long for one prompt, preferably at sentence ends"""
+    # estimate_tokens adds one token to the characters / 4
+    max_chars = (max_tokens - 1) * 4
+    if max_chars <= 0:
+        raise ValueError(f"cannot split a text into parts of {max_tokens} tokens")
+    parts = []
+    while len(text) > max_chars:
+        cut = text.rfind(". ", 0, max_chars)
+        cut = cut + 1 if cut > max_chars // 2 else max_chars
+        parts.append(text[:cut].strip())
+        text = text[cut:]
+    if text.strip():
+        parts.append(text.strip())
+    return parts
+
+
+def section_tokens(title, text):
+    """tokens of a section in chunk_text, with its title and the separator before it"""
+    return estimate_tokens(f"\n\n{title}\n{text}")
+
+
+def split_section(title, text, budget):
+    """split a section larger than budget into numbered parts that fit it with their titles"""
+    header_tokens = estimate_tokens(f"\n\n{title} ({len(text)})\n")
+    return [(f"{title} ({i + 1})", part) for i, part in enumerate(split_text(text, budget - header_tokens))]
+
+
+def pack_chunks(titles, sections, budget):
+    """pack sections in document order into chunks of at most budget tokens (of their chunk_text)"""
+    chunks = [[]]
+    used = 0
+    for title in titles:
+        text = sections[title]
+        tokens = section_tokens(title, text)
+        if tokens > budget:
+            # a single section larger than the budget is split over several chunks
+            chunks.extend([part] for part in split_section(title, text, budget))
+            chunks.append([])
+            used = 0
+            continue
+        if used + tokens > budget and chunks[-1]:
+            chunks.append([])
+            used = 0
+        chunks[-1].append((title, text))
+        used += tokens
+    return [chunk for chunk in chunks if chunk]
+
+
+def plan_sections(sections, checklist, budget=DEFAULT_TOKEN_BUDGET, min_relevance=MIN_RELEVANCE):
+    """Choose sections for the prompt without user interaction.
+
+    The relevant sections (best section of every category and everything scoring at least min_relevance)
+    are always used, the remaining ones are added by score as long as the budget allows.
+    If the relevant sections alone do not fit, they are split into several chunks under the budget
+    that are evaluated separately and merged with merge_evaluations (map/reduce).
+
+    Returns a list of chunks, each a list of (title, text) in document order.
+    """
+    scores = score_sections(sections, checklist)
+    if not scores:
+        return pack_chunks(list(sections), sections, budget)
+
+    relevant = {title for title, by_category in scores.items() if max(by_category.values(), default=0) >= min_relevance}
+    categories = {category for by_category in scores.values() for category in by_category}
+    for category in categories:
+        relevant.add(max(scores, key=lambda title: scores[title][category]))
+
+    order = [title for title in sections if title in scores]
+    relevant_tokens = sum(section_tokens(title, sections[title]) for title in relevant)
+    if relevant_tokens > budget:
+        return pack_chunks([title for title in order if title in relevant], sections, budget)
+
+    selected = set(relevant)
+    used = relevant_tokens
+    optional = sorted((title for title in order if title not in relevant),
+                      key=lambda title: max(scores[title].values(), default=0), reverse=True)
+    for title in optional:
+        tokens = section_tokens(title, sections[title])
+        if used + tokens <= budget:
+            selected.add(title)
+            used += tokens
+    return [[(title, sections[title]) for title in order if title in selected]]
+
+
+def plan_category_sections(sections, checklist, budget=DEFAULT_TOKEN_BUDGET, min_relevance=MIN_RELEVANCE):
+    """Choose sections for one request per checklist category.
+
+    For every category its most relevant section and all sections scoring at least min_relevance
+    for it are added by relevance while they fit the budget, sections larger than the budget are split into parts first.
+    Returns {category: [(title, text), ...]} with the sections in document order.
+    """
+    expanded = {}
+    for title, text in sections.items():
+        if section_tokens(title, text) > budget:
+            expanded.update(split_section(title, text, budget))
+        else:
+            expanded[title] = text
+
+    scores = score_sections(expanded, checklist)
+    order = [title for title in expanded if title in scores]
+    plans = {}
+    for category in checklist:
+        name = category["category"]
+        selected = set()
+        used = 0
+        for rank, title in enumerate(sorted(order, key=lambda title: scores[title].get(name, 0), reverse=True)):
+            if rank and scores[title].get(name, 0) < min_relevance:
+                break
+            tokens = section_tokens(title, expanded[title])
+            if used + tokens <= budget:
+                selected.add(title)
+                used += tokens
+        plans[name] = [(title, expanded[title]) for title in order if title in selected]
+    return plans
+
+
+def chunk_text(chunk):
+    return "\n\n".join(f"{title}\n{text}" for title, text in chunk)
+
+
+def merge_evaluations(evaluations):
+    """Merge the evaluations of several chunks of the same paper.
+
+    A criterion is met if it is met in any chunk, the justification is taken from that chunk.
+    """
+    merged = {}
+    for evaluation in evaluations:
+        for category in evaluation:
+            results = merged.setdefault(category["category"], {})
+            for result in category["results"]:
+                name = result["criterion"]
+                if name not in results or (results[name]["status"] == "Not Met" and result["status"] != "Not Met"):
+                    results[name] = result
+    return [{"category": category, "results": list(results.values())} for category, results in merged.items()]
@@ -0,0 +1,153 @@
+import time
+import json
+import uuid
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+# paper the current thread works on, copied into worker threads with contextvars.copy_context()
+current_paper = contextvars.ContextVar("current_paper", default=None)
+
+# event fields that are summed up per run and per paper
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "tokens_saved")
+
+
+class MetricsRegistry:
+    """In-process aggregation of the telemetry events: event counters, durations per stage
+    and duration and tokens per paper"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.durations = defaultdict(list)
+        self.papers = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, event, fields):
+        with self.lock:
+            self.counters[event] += 1
+            for flag in ("cached", "repaired", "ok"):
+                if fields.get(flag) is not None:
+                    self.counters[f"{event}.{flag}" if fields[flag] else f"{event}.not_{flag}"] += 1
+            if "duration_ms" in fields:
+                self.durations[event].append(fields["duration_ms"])
+            paper = fields.get("paper")
+            for name in TOKEN_FIELDS:
+                if fields.get(name):
+                    self.counters[name] += fields[name]
+                    if paper:
+                        self.papers[paper][name] += fields[name]
+            if paper and event == "paper" and "duration_ms" in fields:
+                self.papers[paper]["duration_ms"] += fields["duration_ms"]
+
+    def summary(self):
+        with self.lock:
+            stages = {}
+            for event, durations in self.durations.items():
+                durations = np.array(durations)
+                stages[event] = {
+                    "count": len(durations),
+                    "total_s": round(float(durations.sum()) / 1000, 2),
+                    "p50_ms": round(float(np.percentile(durations, 50)), 1),
+                    "p90_ms": round(float(np.percentile(durations, 90)), 1),
+                    "max_ms": round(float(durations.max()), 1),
+                }
+            papers = {paper: dict(values) for paper, values in self.papers.items()}
+            return {"counters": dict(self.counters), "stages": stages, "papers": papers}
+
+    def report(self, slowest=5):
+        """print the summary of the run"""
+        summary = self.summary()
+        print("Stage timings:")
+        for event, stage in summary["stages"].items():
+            print(f"  {event:<12} {stage['count']:>6}x  p50 {stage['p50_ms']:>9.1f} ms  p90 {stage['p90_ms']:>9.1f} ms  "
+                  f"max {stage['max_ms']:>9.1f} ms  total {stage['total_s']:>8.1f} s")
+        counters = summary["counters"]
+        print(f"LLM calls: {counters.get('llm', 0)} ({counters.get('llm.cached', 0)} from cache), "
+              f"retries: {counters.get('retry', 0)}, parse repairs: {counters.get('parse.repaired', 0)}, "
+              f"titles not found: {counters.get('title_not_found', 0)}")
+
+        papers = summary["papers"]
+        if papers:
+            input_tokens = sum(paper.get("input_tokens", 0) for paper in papers.values())
+            output_tokens = sum(paper.get("output_tokens", 0) for paper in papers.values())
+            tokens_saved = sum(paper.get("tokens_saved", 0) for paper in papers.values())
+            print(f"Tokens per paper: {input_tokens / len(papers):.0f} in, {output_tokens / len(papers):.0f} out, "
+                  f"{tokens_saved / len(papers):.0f} saved by text normalization ({len(papers)} papers)")
+            ranked = sorted(papers.items(), key=lambda item: item[1].get("duration_ms", 0), reverse=True)
+            print("Slowest papers:")
+            for paper, values in ranked[:slowest]:
+                print(f"  {paper}: {values.get('duration_ms', 0) / 1000:.1f} s, "
+                      f"{values.get('input_tokens', 0):.0f} input tokens")
+        return summary
+
+
+class Telemetry:
+    """Structured run events.
+
+    Every event goes to the MetricsRegistry and, with a log_path, as one JSON line to the log,
+    which is appended to so runs can be compared over time. Events carry the run id and the
+    paper that is being evaluated (see paper()).
+    """
+
+    def __init__(self, log_path=None):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.metrics = MetricsRegistry()
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.log = open(log_path, "a", encoding="utf-8") if log_path else None
+
+    def emit(self, event, **fields):
+        paper = current_paper.get()
+        if paper is not None:
+            fields.setdefault("paper", paper)
+        self.metrics.observe(event, fields)
+        if self.log is not None:
+            record = {"time": time.time(), "run": self.run_id, "event": event, **fields}
+            line = json.dumps(record, ensure_ascii=False, default=str)
+            with self.lock:
+                self.log.write(line + "\n")
+                self.log.flush()
+
+    @contextmanager
+    def span(self, event, **fields):
+        """time the block and emit it as one event, fields can still be added to the yielded dict.
+        An exception is recorded with ok=False and raised again."""
+        start = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields.update(ok=False, error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            fields.setdefault("ok", True)
+            self.emit(event, duration_ms=round((time.perf_counter() - start) * 1000, 2), **fields)
+
+    @contextmanager
+    def paper(self, file_id):
+        """attribute all events of the block (in this thread) to the paper"""
+        token = current_paper.set(file_id)
+        try:
+            yield
+        finally:
+            current_paper.reset(token)
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry():
+    """the Telemetry the pipeline reports to, by default metrics only without a log"""
+    return _telemetry
+
+
+def set_telemetry(telemetry):
+    global _telemetry
+    _telemetry = telemetry
+    return telemetry
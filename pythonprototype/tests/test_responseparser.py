@@ -0,0 +1,44 @@
+from responseparser import IncrementalJSONParser, parse_evaluation
+
+CHECKLIST = [{"category": "Open Code", "criteria": [{"name": "Code 1"}, {"name": "Code 2"}]}]
+
+# smart quotes, a raw newline in a string, a trailing comma and a bracket in the commentary before the JSON
+RESPONSE = (
+    'Here is the result [JSON]:\n```json\n[\n'
+    ' {“category”: “Open Code”, "results": [\n'
+    '  {"criterion": "Code 1", "status": "Met", "justification": "first line\nsecond line"},\n'
+    '  {"criterion": "Code 2", "status": "not met", "justification": "no link",}\n'
+    ' ]}\n]\n```'
+)
+
+
+def feed_in_chunks(parser, text, size=5):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+def test_stream_repairs_like_the_full_parse():
+    parser = IncrementalJSONParser()
+    events = feed_in_chunks(parser, RESPONSE)
+    criteria = [event for event in events if event[0] == "criterion"]
+    assert [(event[1], event[2]["criterion"]) for event in criteria] == [("Open Code", "Code 1"), ("Open Code", "Code 2")]
+    assert criteria[0][2]["justification"] == "first line\nsecond line"
+    # the statuses are only normalized by the full parse
+    assert [result["status"] for result in parser.result()[0]["results"]] == ["Met", "not met"]
+    assert [result["status"] for result in parse_evaluation(RESPONSE, CHECKLIST)[0]["results"]] == ["Met", "Not Met"]
+
+
+def test_bracket_in_commentary_does_not_start_the_array():
+    parser = IncrementalJSONParser()
+    feed_in_chunks(parser, "See the results [below] and [1]:\n" + RESPONSE)
+    assert len(parser.result()) == 1
+
+
+def test_unparseable_object_is_skipped():
+    parser = IncrementalJSONParser()
+    events = feed_in_chunks(parser, '[{"category": "Open Code", "results": [{"criterion": Code 1}]}]')
+    assert not [event for event in events if event[0] == "criterion"]
+    assert parser.skipped == 2
+    assert parser.result() == []
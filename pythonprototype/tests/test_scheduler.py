@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import pytest
+from llmbackends import StubBackend, StubError
+from scheduler import RateLimiter, EvaluationScheduler, is_retryable, backoff_delay
+
+CHECKLIST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "checklist.json")
+
+
+class FakeClock:
+    """clock and sleep for the rate limiter, sleeping advances the time"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class ResponseError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.response = Response(status_code)
+
+
+def flaky(failures, error):
+    """callable failing `failures` times with error before it returns "ok" """
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    func.calls = calls
+    return func
+
+
+@pytest.mark.parametrize("error, expected", [
+    (StubError(429), True),
+    (StubError(503), True),
+    (StubError(400), False),
+    (StatusError(500), True),
+    (StatusError(404), False),
+    (ResponseError(502), True),
+    (ResponseError(401), False),
+    (ValueError("no status"), False),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base_delay=2.0, max_delay=5.0) <= 5.0
+
+
+def test_call_retries_retryable_errors_with_backoff():
+    clock = FakeClock()
+    with EvaluationScheduler(1, max_retries=3, base_delay=1.0, max_delay=4.0, sleep=clock.sleep) as scheduler:
+        func = flaky(2, StubError(503))
+        assert scheduler.call(func, "paper", tokens=10) == "ok"
+    assert len(func.calls) == 3
+    assert func.calls[0] == (("paper",), {})
+    assert len(clock.sleeps) == 2
+    assert clock.sleeps[0] <= 1.0 and clock.sleeps[1] <= 2.0
+    assert scheduler.queue_depth()["retries"] == 2
+
+
+def test_call_gives_up_after_max_retries():
+    clock = FakeClock()
+    with EvaluationScheduler(1, max_retries=2, sleep=clock.sleep) as scheduler:
+        func = flaky(10, StubError(429))
+        with pytest.raises(StubError):
+            scheduler.call(func)
+    assert len(func.calls) == 3
+    assert scheduler.queue_depth()["retries"] == 2
+
+
+def test_call_does_not_retry_other_errors():
+    clock = FakeClock()
+    with EvaluationScheduler(1, sleep=clock.sleep) as scheduler:
+        func = flaky(1, StubError(400))
+        with pytest.raises(StubError):
+            scheduler.call(func)
+    assert len(func.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_call_with_stub_backend_errors():
+    with open(CHECKLIST_PATH, "r") as f:
+        checklist = json.load(f)
+    backend = StubBackend(error_rate=0.5, seed=1)
+    clock = FakeClock()
+    with EvaluationScheduler(1, max_retries=20, sleep=clock.sleep) as scheduler:
+        for i in range(5):
+            assert scheduler.call(backend.generate, f"paper {i}", checklist)
+    assert backend.errors > 0
+    assert scheduler.queue_depth()["retries"] == backend.errors
+
+
+def test_rate_limiter_blocks_on_requests_per_minute():
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=2, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire() == 0
+    clock.now = 10
+    assert limiter.acquire() == 0
+    clock.now = 20
+    # the third request waits until the first one left the window
+    assert limiter.acquire() == pytest.approx(40)
+    assert clock.now == pytest.approx(60)
+
+
+def test_rate_limiter_blocks_on_tokens_per_minute():
+    clock = FakeClock()
+    limiter = RateLimiter(tokens_per_minute=1000, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire(600) == 0
+    clock.now = 30
+    assert limiter.acquire(300) == 0
+    clock.now = 45
+    # 600 + 300 + 200 is over the budget, the first request has to leave the window
+    assert limiter.acquire(200) == pytest.approx(15)
+    clock.now = 61
+    # 300 + 200 + 500 fits exactly
+    assert limiter.acquire(500) == 0
+
+
+def test_rate_limiter_admits_large_request_into_empty_window():
+    clock = FakeClock()
+    limiter = RateLimiter(tokens_per_minute=100, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire(500) == 0
+    assert limiter.acquire(1) == pytest.approx(60)
+
+
+def test_call_reports_rate_limited_time():
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=1, clock=clock, sleep=clock.sleep)
+    with EvaluationScheduler(1, limiter=limiter, sleep=clock.sleep) as scheduler:
+        scheduler.call(lambda: "ok")
+        scheduler.call(lambda: "ok")
+    assert scheduler.queue_depth()["rate_limited_seconds"] == pytest.approx(60)
+
+
+def test_queue_depth_counts_queued_running_and_finished():
+    release = threading.Event()
+    started = threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    scheduler = EvaluationScheduler(1)
+    try:
+        futures = [scheduler.submit(job) for _ in range(3)]
+        assert started.wait(5)
+        depth = scheduler.queue_depth()
+        assert (depth["queued"], depth["running"], depth["finished"]) == (2, 1, 0)
+        release.set()
+        assert [future.result(5) for future in futures] == ["done"] * 3
+        depth = scheduler.queue_depth()
+        assert (depth["queued"], depth["running"], depth["finished"]) == (0, 0, 3)
+    finally:
+        release.set()
+        scheduler.shutdown()
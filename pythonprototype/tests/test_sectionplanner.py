@@ -0,0 +1,40 @@
+import json
+import os
+import pytest
+from sectionplanner import estimate_tokens, split_text, pack_chunks, plan_sections, plan_category_sections, chunk_text
+
+CHECKLIST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "checklist.json")
+
+SENTENCE = "We collected the data of 120 participants and the analysis code is available at github.com/lab/study. "
+
+
+@pytest.fixture
+def checklist():
+    with open(CHECKLIST_PATH) as f:
+        return json.load(f)
+
+
+def paper(section_lengths):
+    """sections of the given number of sentences, with titles like the proceedings"""
+    titles = ["Abstract", "1 Introduction", "2 Method", "3 Results", "4 Discussion and Limitations", "5 Conclusion"]
+    return {titles[i % len(titles)] + ("" if i < len(titles) else f" {i}"): SENTENCE * length
+            for i, length in enumerate(section_lengths)}
+
+
+@pytest.mark.parametrize("budget", [50, 200, 1200, 3000])
+def test_split_text_parts_fit(budget):
+    assert all(estimate_tokens(part) <= budget for part in split_text(SENTENCE * 200, budget))
+
+
+@pytest.mark.parametrize("budget", [60, 200, 1200, 3000])
+def test_chunks_fit_the_budget(checklist, budget):
+    sections = paper([3, 40, 150, 60, 20, 5, 1])
+    chunks = pack_chunks(list(sections), sections, budget) + plan_sections(sections, checklist, budget) \
+        + list(plan_category_sections(sections, checklist, budget).values())
+    for chunk in chunks:
+        assert estimate_tokens(chunk_text(chunk)) <= budget
+
+
+def test_split_needs_room_for_the_text():
+    with pytest.raises(ValueError):
+        split_text(SENTENCE, 1)
@@ -0,0 +1,139 @@
+import os
+import re
+import argparse
+from collections import Counter
+from sectionplanner import estimate_tokens
+
+# joins single line breaks, double line breaks are kept
+SINGLE_NEWLINE = re.compile(r'(?<!\n)\n(?!\n)')
+
+# ligature glyphs and invisible characters of the PDF fonts
+LIGATURES = str.maketrans({
+    "ﬀ": "ff", "ﬁ": "fi", "ﬂ": "fl", "ﬃ": "ffi", "ﬄ": "ffl", "ﬅ": "st", "ﬆ": "st",
+    "\u00ad": "", "\u200b": "", "\u00a0": " ",
+})
+
+# a word broken at the end of a line, only before a lowercase letter so "COVID-\n19" and "Self-\nReport" keep it
+HYPHENATED = re.compile(r"\b([A-Za-z]*[a-z])-\n([a-z]+)")
+# hyphenated words within a line, a broken word that is also written like this keeps its hyphen
+COMPOUND = re.compile(r"\b[A-Za-z]+-[a-z]+\b")
+
+# copyright and citation blocks of the first page, the citation repeats title and authors
+BOILERPLATE = re.compile(
+    r"^(?:This work is licensed under a Creative Commons[^\n]*(?:\n[^\n]*License\.)?"
+    r"|Permission to make digital or hard copies[\s\S]{0,1200}?permissions@acm\.org\.?"
+    r"|©\s?\d{4} [^\n]*"
+    r"|ACM ISBN [^\n]*(?:\nhttps://doi\.org/[^\n]*)?"
+    r"|ACM Reference Format:\n[\s\S]{0,1200}?https:\s?//\s?doi\.org/[\w./]*(?:\n[\w./]+(?=\n|$))?)$\n?",
+    re.MULTILINE,
+)
+
+SPACES = re.compile(r"[ \t]+")
+SPACE_AROUND_NEWLINE = re.compile(r" ?\n ?")
+BLANK_LINES = re.compile(r"\n{3,}")
+DIGITS = re.compile(r"\d+")
+
+# lines at the top and bottom of a page that are checked for running headers, footers and page numbers
+EDGE_LINES = 2
+
+# a line at the page edge is page furniture if it is on at least this share of the pages (alternating
+# headers of even and odd pages are on half of them), with digits ignored so page numbers match
+FURNITURE_SHARE = 0.4
+FURNITURE_MIN_PAGES = 3
+
+
+def furniture_key(line):
+    return DIGITS.sub("#", SPACES.sub(" ", line.strip()))
+
+
+def edge_lines(lines):
+    """indices of the first and last EDGE_LINES non-empty lines"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def find_furniture(page_lines):
+    """keys of the lines that repeat at the top or bottom of many pages"""
+    if len(page_lines) < FURNITURE_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for lines in page_lines:
+        counts.update({furniture_key(lines[i]) for i in edge_lines(lines)})
+    minimum = max(2, FURNITURE_SHARE * len(page_lines))
+    return {key for key, count in counts.items() if count >= minimum and key}
+
+
+def strip_furniture(page_texts):
+    """remove running headers, footers and page numbers from the page texts"""
+    page_lines = [(text or "").split("\n") for text in page_texts]
+    furniture = find_furniture(page_lines)
+    pages = []
+    for lines in page_lines:
+        edges = edge_lines(lines)
+        pages.append("\n".join(line for i, line in enumerate(lines)
+                               if i not in edges or furniture_key(line) not in furniture))
+    return pages
+
+
+def dehyphenate(text):
+    """rejoin the words broken at line ends"""
+    compounds = {word.lower() for word in COMPOUND.findall(text)}
+
+    def join(match):
+        word = f"{match.group(1)}-{match.group(2)}"
+        return word if word.lower() in compounds else match.group(1) + match.group(2)
+
+    return HYPHENATED.sub(join, text)
+
+
+def normalize_pages(page_texts):
+    """Clean the page texts and join them into one text with the line breaks kept:
+    page furniture and first page boilerplate are removed, ligatures replaced and hyphenated words rejoined
+    (also across pages)."""
+    text = "\n".join(strip_furniture(page_texts))
+    text = BOILERPLATE.sub("", text.translate(LIGATURES))
+    return dehyphenate(text)
+
+
+def collapse_whitespace(text):
+    text = SPACE_AROUND_NEWLINE.sub("\n", SPACES.sub(" ", text))
+    return BLANK_LINES.sub("\n\n", text).strip()
+
+
+def join_lines(text):
+    """join single line breaks so that headlines broken over lines are found, double line breaks are kept"""
+    return collapse_whitespace(SINGLE_NEWLINE.sub(" ", text))
+
+
+def savings(raw, normalized):
+    """characters and estimated tokens the normalization saved"""
+    return {
+        "characters_before": len(raw),
+        "characters": len(normalized),
+        "tokens_saved": estimate_tokens(raw) - estimate_tokens(normalized),
+    }
+
+
+if __name__ == "__main__":
+    from pypdf import PdfReader
+    from pdfextraction import iter_page_texts
+
+    parser = argparse.ArgumentParser(description="Report the characters and tokens the normalization saves per paper")
+    parser.add_argument("pdf_dir", nargs="?", default="lakproceedings")
+    args = parser.parse_args()
+
+    total_before = total_after = total_saved = 0
+    for name in sorted(os.listdir(args.pdf_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        page_texts = list(iter_page_texts(PdfReader(os.path.join(args.pdf_dir, name))))
+        raw = SINGLE_NEWLINE.sub(" ", "".join(text + "\n" for text in page_texts))
+        saved = savings(raw, join_lines(normalize_pages(page_texts)))
+        total_before += saved["characters_before"]
+        total_after += saved["characters"]
+        total_saved += saved["tokens_saved"]
+        print(f"{name}: {saved['characters_before']} -> {saved['characters']} characters, "
+              f"{saved['tokens_saved']} tokens saved")
+    if total_before:
+        print(f"Total: {total_before} -> {total_after} characters ({1 - total_after / total_before:.1%} saved), "
+              f"{total_saved} tokens saved")